@@ -1,19 +1,71 @@
 """
 James Verschleiser
-Minimax algorithm for my Chess game
+Negamax principal variation search for my Chess game
 """
 
+import copy
+import threading
+import time
+from array import array
+
+# kinds of scores stored in the transposition table
+EXACT = 0       # the real score of the position
+LOWER = 1       # the search failed high so the real score is at least this
+UPPER = 2       # the search failed low so the real score is at most this
+
+MAX_DEPTH = 64      # deepest iteration a timed search will try
+DELTA_MARGIN = 200  # centipawns a capture is allowed to gain beyond the captured piece's value in quiescence
+
+INFINITE = 50000    # bigger than any score
+MATE = 9999         # score of being checkmated right now, mates further away score a ply less per move
+MATE_BOUND = MATE - 2 * MAX_DEPTH - 256     # scores past this are mates, searched or from the endgame tables
+
+ASPIRATION_DEPTH = 4        # first iteration searched with a narrow window around the last score
+ASPIRATION_WINDOW = 35      # centipawns either side of the last score, widened four times each time it misses
+MAX_WINDOW = 1000           # a window wider than this is opened all the way
+
+NULL_MIN_DEPTH = 3          # shallowest depth a null move is tried at
+NULL_REDUCTION = 2          # how much shallower the search after a null move is (one more deeper in the tree)
+LMR_MIN_DEPTH = 3           # shallowest depth late moves are reduced at
+LMR_MOVES = 4               # moves searched at full depth before the rest are reduced (twice as many for two plies)
+
+
+# raised inside the search when its time or node budget runs out
+class SearchTimeout(Exception):
+    pass
+
 
 class AI:
 
-    def __init__(self, game):
+    def __init__(self, game, tt_size=16, ordering=True, quiescence=True, book=None, tablebase=None):
         self.game = game
+        self.book = book        # opening book (ChessBook.Book) to play from before searching
+        self.tablebase = tablebase      # endgame tables (ChessTablebase.Tablebase) giving perfect scores
 
         # values of the various pieces
         self.values = {"wP": 10, "bP": -10, "wB": 30, "bB": -30, "wN": 30, "bN": -30, "wR": 50, "bR": -50, \
                        "wQ": 90, "bQ": -90, "wK": 900, "bK": -900}
 
-    # function to find the best move available
+        self.tt = TranspositionTable(tt_size)       # remembers positions already searched (size in megabytes)
+
+        self.nodes = 0              # positions visited by the current search
+        self.deadline = None        # perf_counter time the current search has to stop by
+        self.node_limit = None      # most nodes the current search may visit
+        self.depth = 0              # depth of the last completed iteration of the search
+        self.best_score = 0         # score of the move the last search found (positive is good for black)
+        self.stopped = False        # set from another thread to stop the search
+        self.stats = None           # ChessStats.SearchStats counting what the searches do, None to count nothing
+        self.pv = []                # moves the last search expects to be played, starting with the move it found
+        self.root_pv = []           # principal variation of the root search in progress
+        self.pv_table = [[] for _ in range(2 * MAX_DEPTH + 2)]     # best line found from each ply of the search
+
+        self.ordering = ordering    # sort moves by captures, killers and history (otherwise only the stored move goes first)
+        self.killers = [[0, 0] for _ in range(2 * MAX_DEPTH)]       # two quiet moves per ply that caused cutoffs
+        self.history = {"w": [0] * 4096, "b": [0] * 4096}          # how often each from-to quiet move caused cutoffs
+        self.quiescence = quiescence    # keep searching captures past the last ply instead of scoring right away
+
+    # function to find the best move available, the search goes one ply deeper at a time up to depth so each
+    # iteration's best moves are tried first in the next one
     def find_move(self, depth, maximize):
         moves = self.game.all_moves()      # generate all valid moves
 
@@ -22,73 +74,572 @@ class AI:
             self.game.checkmate = True
             return None
 
-        best_move = -9999       # score of the best move
+        move = self.book_move()
+        if move is None:
+            move = self.tablebase_move()
+        if move is not None:
+            return move
+
+        self.new_search()
+        return self.iterate(self.order_moves(moves, 0, self.tt.probe(self.game.key)), maximize, depth)
+
+    # searches deeper and deeper until time_limit milliseconds (or node_limit nodes) are used up, then returns the
+    # best move of the deepest search that finished
+    def timed_find_move(self, time_limit, maximize, node_limit=None, max_depth=MAX_DEPTH):
+        moves = self.game.all_moves()
+
+        if len(moves) == 0:
+            self.game.checkmate = True
+            return None
+
+        move = self.book_move()
+        if move is None:
+            move = self.tablebase_move()
+        if move is not None:
+            return move
+
+        start = time.perf_counter()
+        self.deadline = None if time_limit is None else start + time_limit / 1000
+        self.node_limit = node_limit
+        self.new_search()
+
+        final_move = self.iterate(self.order_moves(moves, 0, self.tt.probe(self.game.key)), maximize, max_depth, True)
+
+        self.deadline = None
+        self.node_limit = None
+
+        return final_move
+
+    # the iterative deepening loop shared by both searches, with timed set it stops early when there is only one
+    # move or the next iteration wouldn't finish in time, and a search that runs out of budget keeps the last result
+    def iterate(self, moves, maximize, max_depth, timed=False):
+
+        start = time.perf_counter()
+        root = len(self.game.log)
+        final_move = moves[0]
+        score = 0
+        self.best_score = 0
+        self.depth = 0
+        self.pv = [final_move]
+
+        for depth in range(1, max_depth + 1):
+
+            try:
+                score, move = self.aspiration(depth, score, moves)
+            except SearchTimeout:
+                while len(self.game.log) > root:        # take back the moves the search was in the middle of
+                    self.game.undo_move()
+                break
+
+            # scores inside the search are for the side to move, outside they are positive when good for black
+            self.best_score = score if maximize else -score
+            final_move = move
+            self.depth = depth
+            self.pv = self.root_pv if self.root_pv else [move]
+            if self.stats is not None:
+                self.stats.iteration(depth, self.nodes, time.perf_counter() - start)
+
+            # the best move is searched first next time so the rest can be cut off quickly
+            moves.insert(0, moves.pop(moves.index(final_move)))
+
+            # with one move there is nothing to think about, and a deeper search won't finish in the time left
+            if timed and len(moves) == 1:
+                break
+            if self.deadline is not None and time.perf_counter() - start > (self.deadline - start) / 2:
+                break
+
+        return final_move
+
+    # a move from the opening book for the current position, or None if it isn't in the book
+    def book_move(self):
+
+        if self.book is None:
+            return None
+
+        move = self.book.choose(self.game)
+        if move is not None:
+            self.best_score = 0
+            self.depth = 0
+            self.nodes = 0
+            self.pv = [move]
+        return move
+
+    # the best move according to the endgame tables, or None if the position isn't in them
+    def tablebase_move(self):
+
+        if self.tablebase is None:
+            return None
+
+        move = self.tablebase.best_move(self.game)[0]
+        if move is not None:
+            self.best_score = self.tablebase.score(self.game)
+            self.depth = 0
+            self.nodes = 0
+            self.pv = [move]
+        return move
+
+    # forgets everything learned from earlier searches so the next one doesn't depend on what came before it
+    def clear(self):
+
+        self.tt.clear()
+        self.killers = [[0, 0] for _ in range(2 * MAX_DEPTH)]
+        self.history = {"w": [0] * 4096, "b": [0] * 4096}
+
+    # resets what only applies to one search, history is halved instead of cleared so it still helps the next one
+    def new_search(self):
+
+        self.nodes = 0
+        self.tt.new_search()
+        self.killers = [[0, 0] for _ in range(2 * MAX_DEPTH)]
+        self.pv_table = [[] for _ in range(2 * MAX_DEPTH + 2)]
+        for color in self.history:
+            self.history[color] = [value // 2 for value in self.history[color]]
+
+    # searches the root with a narrow window around the last iteration's score, which cuts off more, and searches
+    # again with a wider one when the score lands outside it
+    def aspiration(self, depth, guess, moves):
+
+        if depth < ASPIRATION_DEPTH or abs(guess) >= MATE_BOUND:
+            return self.search_root(depth, -INFINITE, INFINITE, moves)
+
+        window = ASPIRATION_WINDOW
+        alpha, beta = guess - window, guess + window
+        while True:
+            score, move = self.search_root(depth, alpha, beta, moves)
+            if alpha < score < beta:
+                return score, move
+
+            window *= 4
+            if score <= alpha:
+                alpha = guess - window if window < MAX_WINDOW else -INFINITE
+            else:
+                beta = guess + window if window < MAX_WINDOW else INFINITE
+
+    # tries every move at the root, the first with the full window and the rest with a null window that only proves
+    # they are worse (searching them again fully when they turn out better), returns the score for the side to move
+    def search_root(self, depth, alpha, beta, moves):
+
+        best_score = -INFINITE
         final_move = None
+        self.root_pv = []
+        if self.stats is not None:
+            self.stats.node(0)
+            self.stats.expand(0, len(moves))
 
         for move in moves:  # for each possible move
 
             self.game.make_move(move)   # make the move
-            score = max(best_move, self.minimax(depth - 1, not maximize))
+            if final_move is None:
+                score = -self.search(depth - 1, -beta, -alpha, 1)
+            else:
+                score = -self.search(depth - 1, -alpha - 1, -alpha, 1)
+                if alpha < score < beta:
+                    score = -self.search(depth - 1, -beta, -alpha, 1)
             self.game.undo_move()       # undo made move
 
-            if score > best_move:       # if the board is better now than before the move was made
-                best_move = score
+            if score > best_score or final_move is None:
+                best_score = score
                 final_move = move
+                if score > alpha:
+                    alpha = score
+                    self.root_pv = [move] + self.pv_table[1]
 
-        return final_move
+            if alpha >= beta:
+                break
+
+        return best_score, final_move
+
+    # counts a node and stops the search when the budget runs out or it is stopped (the clock is read every 32 nodes,
+    # a millisecond or two of searching, so even a budget of ten milliseconds is only overrun by a little)
+    def visit(self):
+
+        self.nodes += 1
+        if self.nodes & 31 == 0:
+            if self.stopped or (self.deadline is not None and time.perf_counter() > self.deadline):
+                raise SearchTimeout
+        if self.node_limit is not None and self.nodes > self.node_limit:
+            raise SearchTimeout
+
+    # negamax principal variation search, the score is for the side to move and only scores between alpha and beta
+    # are exact, ply is how many moves deep into the search this position is, null says a null move may be tried
+    def search(self, depth, alpha, beta, ply, null=True):
+
+        stats = self.stats
+        if stats is not None:
+            stats.node(ply)
+        self.pv_table[ply] = []
+
+        # a repeated position or a run out fifty move clock is a draw however the search would go on
+        if self.game.is_draw(1):
+            self.visit()
+            return 0
 
-    # helper function to find best move
-    def minimax(self, depth, maximize, alpha=-50000, beta=50000):
+        # positions in the endgame tables already have a perfect score (given from black's side)
+        if self.tablebase is not None:
+            score = self.tablebase.score(self.game, ply)
+            if score is not None:
+                self.visit()
+                return score if self.game.turn == "b" else -score
 
         # if this is the last move before returning
-        if depth == 0:
-            return -self.score()
+        if depth <= 0:
+            if self.quiescence:
+                return self.quiesce(alpha, beta, ply)
+            self.visit()
+            if stats is not None:
+                stats.leaf(ply)
+            return self.evaluate()
 
-        # calculate the next set of moves
-        moves = self.game.all_moves()
+        self.visit()
+
+        # outside the principal variation (a null window) a score stored from a deep enough search can answer right
+        # away, on it the search goes on so the whole variation is found
+        pv_node = beta - alpha > 1
+        entry = self.tt.probe(self.game.key)
+        if entry is not None and entry[0] >= depth and not pv_node:
+            flag, score = entry[1], from_tt(entry[2], ply)
+            if flag == EXACT or (flag == LOWER and score >= beta) or (flag == UPPER and score <= alpha):
+                if stats is not None:
+                    stats.tt_cutoff(ply)
+                return score
+
+        check = self.game.in_check()
+
+        # null move pruning: if passing the turn and searching shallower still fails high, a real move would too, not
+        # tried in check, on the principal variation or without pieces (where passing can be better than any move)
+        if null and not pv_node and not check and depth >= NULL_MIN_DEPTH and \
+                self.game.has_pieces(self.game.turn) and self.evaluate() >= beta:
+            reduction = NULL_REDUCTION + (1 if depth > 6 else 0)
+            self.game.make_null_move()
+            score = -self.search(depth - 1 - reduction, -beta, -beta + 1, ply + 1, False)
+            self.game.undo_move()
+            if score >= beta:
+                return beta if score >= MATE_BOUND else score       # an unproven mate isn't passed up
 
-        # depending on whose turn it is
-        if maximize:
+        # calculate the next set of moves, trying the best looking ones first
+        moves = self.order_moves(self.game.all_moves(), ply, entry)
 
-            best_move = -9999
+        # with no moves it is checkmate (sooner is worse for the side to move) or stalemate
+        if not moves:
+            return -MATE + ply if check else 0
+        if stats is not None:
+            stats.expand(ply, len(moves))
 
-            for move in moves:
+        alpha_start = alpha
+        best_score = -INFINITE
+        final_move = None
+        killers = self.killers[ply]
+
+        for index, move in enumerate(moves):
 
-                self.game.make_move(move)
-                best_move = max(best_move, self.minimax(depth - 1, not maximize, alpha, beta)) # go forward another move
-                self.game.undo_move()
-                alpha = max(alpha, best_move)
+            quiet = move.end_sq == "--" and not move.pawn_promotion
+            self.game.make_move(move)
 
-                if beta <= alpha:       # eliminates tracks that won't work
-                    return best_move
+            if index == 0:
+                score = -self.search(depth - 1, -beta, -alpha, ply + 1)
+            else:
+                # late quiet moves are unlikely to be best so they are searched shallower first (late move reduction)
+                reduction = 0
+                if depth >= LMR_MIN_DEPTH and index >= LMR_MOVES and quiet and not check and \
+                        move.id not in killers and not self.game.in_check():
+                    reduction = 2 if depth >= 6 and index >= 2 * LMR_MOVES else 1
 
-            return best_move
+                score = -self.search(depth - 1 - reduction, -alpha - 1, -alpha, ply + 1)
+                if score > alpha and reduction:
+                    score = -self.search(depth - 1, -alpha - 1, -alpha, ply + 1)
+                if alpha < score < beta:
+                    score = -self.search(depth - 1, -beta, -alpha, ply + 1)
 
+            self.game.undo_move()
+
+            if score > best_score:
+                best_score = score
+                final_move = move
+                if score > alpha:
+                    alpha = score
+                    self.pv_table[ply] = [move] + self.pv_table[ply + 1]
+
+                    if alpha >= beta:       # eliminates tracks that won't work
+                        self.cutoff(move, depth, ply)
+                        if stats is not None:
+                            stats.cutoff(ply, index == 0)
+                        break
+
+        # remember what was found and whether it is the real score or only a bound on it
+        if best_score <= alpha_start:
+            flag = UPPER
+        elif best_score >= beta:
+            flag = LOWER
         else:
+            flag = EXACT
+        self.tt.store(self.game.key, depth, flag, to_tt(best_score, ply), final_move)
+
+        return best_score
+
+    # searches only captures and promotions until the position is quiet so the score isn't taken in the middle of an
+    # exchange, the side to move can also stop capturing and keep the current score (stand pat)
+    def quiesce(self, alpha, beta, ply, first=True):
+
+        self.visit()
+        stats = self.stats
+        if stats is not None and not first:     # the first call is the main search's node, already counted
+            stats.node(ply)
+
+        # in check right after the main search there is no standing pat, every way out of check is searched (deeper
+        # than that check sequences could go on forever so captures are all that is looked at)
+        check = first and self.game.in_check()
+        if check:
+            moves = self.order_moves(self.game.all_moves(), ply)
+            if not moves:
+                return -MATE + ply
+            best_score = -INFINITE
+        else:
+            best_score = self.evaluate()
+            if stats is not None:
+                stats.leaf(ply)
+            if best_score >= beta:
+                return best_score
+            alpha = max(alpha, best_score)
+
+            moves = [move for move in self.game.capture_moves() if move.promotion == 'Q']    # skip underpromotions
+            moves.sort(key=self.capture_value, reverse=True)
+
+        for move in moves:
+
+            # don't bother with captures that can't win enough material to reach alpha even if they go unanswered
+            # (delta pruning), values are in tenths of a pawn so times ten makes them centipawns
+            if not check:
+                gain = DELTA_MARGIN
+                if move.end_sq != "--":
+                    gain += 10 * abs(self.values[move.end_sq])
+                if move.pawn_promotion:
+                    gain += 10 * abs(self.values[move.start_sq[0] + move.promotion])
+                if best_score + gain <= alpha:
+                    continue
+
+            self.game.make_move(move)
+            score = -self.quiesce(-beta, -alpha, ply + 1, False)
+            self.game.undo_move()
+
+            if score > best_score:
+                best_score = score
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        if stats is not None:
+                            stats.cutoff(ply, move is moves[0])
+                        break
+
+        return best_score
+
+    # the static score of the position for the side to move
+    def evaluate(self):
+        score = self.score()
+        return score if self.game.turn == "w" else -score
+
+    # victim value times ten minus attacker value, plus the value of a promotion
+    def capture_value(self, move):
+
+        value = 0
+        if move.end_sq != "--":
+            value += 10 * abs(self.values[move.end_sq]) - abs(self.values[move.start_sq])
+        if move.pawn_promotion:
+            value += 10 * abs(self.values[move.start_sq[0] + move.promotion])
+        return value
+
+    # sorts the moves so the ones most likely to cause a cutoff come first: the stored best move, then captures of
+    # valuable pieces by cheap ones (and promotions), then this ply's killer moves, then quiet moves by history
+    def order_moves(self, moves, ply, entry=None):
 
-            best_move = 9999
+        if not self.ordering:
+            return self.tt_first(moves, entry)
 
-            for move in moves:
+        tt_move = 0 if entry is None else entry[3]
+        killers = self.killers[ply] if ply < len(self.killers) else (0, 0)
+        history = self.history[self.game.turn]
 
-                self.game.make_move(move)
-                best_move = min(best_move, self.minimax(depth - 1, not maximize, alpha, beta))
-                self.game.undo_move()
-                beta = min(beta, best_move)        # eliminates tracks that won't work
+        def priority(move):
+            number = move.id
+            if number == tt_move:
+                return 1000000
 
-                if beta <= alpha:
-                    return best_move
+            if move.end_sq != "--" or move.pawn_promotion:
+                return 100000 + self.capture_value(move)
 
-            return best_move
+            if number == killers[0]:
+                return 90000
+            if number == killers[1]:
+                return 80000
+            return history[number & 4095]
 
-    # method to evaluate the current position
+        moves.sort(key=priority, reverse=True)
+        return moves
+
+    # a quiet move caused a cutoff, so remember it as a killer for this ply and raise its history score
+    def cutoff(self, move, depth, ply):
+
+        if move.end_sq != "--" or move.pawn_promotion:
+            return
+
+        number = move.id
+        killers = self.killers[ply]
+        if killers[0] != number:
+            killers[1] = killers[0]
+            killers[0] = number
+
+        history = self.history[move.start_sq[0]]
+        history[number & 4095] += depth * depth
+        if history[number & 4095] > 50000:      # keep history below the killer and capture scores
+            self.history[move.start_sq[0]] = [value // 2 for value in history]
+
+    # moves the best move stored for this position to the front of the list
+    def tt_first(self, moves, entry=None):
+
+        if entry is None:
+            entry = self.tt.probe(self.game.key)
+
+        if entry is not None and entry[3] != 0:
+            for i in range(len(moves)):
+                if moves[i].id == entry[3]:
+                    moves.insert(0, moves.pop(i))
+                    break
+
+        return moves
+
+    # method to evaluate the current position, the game keeps the score up to date as moves are made
     def score(self):
+        return self.game.evaluate()
 
-        score = 0
 
-        # for each square
-        for row in range(8):
-            for col in range(8):
-                if self.game.board[row][col] != '--':
-                    score += self.values[self.game.board[row][col]]     # if there is a piece add its value
-                    
-        return score
+# mate scores are stored in the transposition table as the distance to mate from the stored position rather than
+# from the root, so the same position reached at another ply gets the right score back
+def to_tt(score, ply):
+
+    if score >= MATE_BOUND:
+        return score + ply
+    if score <= -MATE_BOUND:
+        return score - ply
+    return score
+
+
+def from_tt(score, ply):
+
+    if score >= MATE_BOUND:
+        return score - ply
+    if score <= -MATE_BOUND:
+        return score + ply
+    return score
+
+
+# runs a timed search on a copy of the game in another thread so the caller can keep going while it thinks
+class BackgroundSearch:
+
+    def __init__(self, ai, time_limit, maximize, node_limit=None, max_depth=MAX_DEPTH, on_done=None):
+
+        # the copy shares the transposition table so what it learns carries over to later searches
+        self.searcher = copy.copy(ai)
+        self.searcher.game = copy.deepcopy(ai.game)
+        self.searcher.stopped = False
+
+        self.move = None            # the move found, in the copied game
+        self.cancelled = False
+        self.on_done = on_done      # called from the search thread with this search when it finishes (unless cancelled)
+
+        self.thread = threading.Thread(target=self.run, args=(time_limit, maximize, node_limit, max_depth), daemon=True)
+        self.thread.start()
+
+    def run(self, time_limit, maximize, node_limit, max_depth):
+        move = self.searcher.timed_find_move(time_limit, maximize, node_limit, max_depth)
+        if not self.cancelled:
+            self.move = move
+            if self.on_done is not None:
+                self.on_done(self)
+
+    # has the search finished
+    def done(self):
+        return not self.thread.is_alive()
+
+    # stops the search early, keeping the best move of the deepest iteration that finished
+    def stop(self):
+
+        self.searcher.stopped = True
+        self.thread.join()
+
+    # stops the search and throws away its result
+    def cancel(self):
+
+        self.cancelled = True
+        self.searcher.stopped = True
+        self.thread.join()
+
+    # the move that was found as one of the moves in the given list (None if there isn't one)
+    def result(self, moves):
+
+        if self.move is None:
+            return None
+
+        for move in moves:
+            if move == self.move:
+                return move
+        return None
+
+
+class TranspositionTable:
+
+    ENTRY_BYTES = 16                # each slot is a 64 bit key and a 64 bit packed entry
+    SCORE_OFFSET = 1 << 19          # scores are stored shifted up so they are never negative
+    EPOCHS = 2048                   # times the table can be emptied by counting before the memory has to be cleared
+
+    def __init__(self, size=16):
+
+        # the number of slots is the biggest power of two that fits in size megabytes
+        slots = max(1, size * 1024 * 1024 // self.ENTRY_BYTES)
+        self.slots = 1 << (slots.bit_length() - 1)
+        self.mask = self.slots - 1
+
+        self.keys = array('Q', bytes(8 * self.slots))
+        self.entries = array('Q', bytes(8 * self.slots))        # 0 means the slot is empty
+        self.generation = 0         # which search the entries were stored in
+        self.epoch = 0              # how many times the table was emptied since its memory was last cleared
+
+    # empties the table, entries stored before are from an older epoch so they count as missing, only once every
+    # epoch has been used is the memory actually cleared (which takes milliseconds for a big table)
+    def clear(self):
+
+        self.epoch = (self.epoch + 1) % self.EPOCHS
+        self.generation = 0
+        if self.epoch == 0:
+            self.keys = array('Q', bytes(8 * self.slots))
+            self.entries = array('Q', bytes(8 * self.slots))
+
+    # called at the start of every search so entries from older searches get replaced first
+    def new_search(self):
+        self.generation = (self.generation + 1) & 63
+
+    # stores a search result, an entry from the current search is only replaced by one searched at least as deep
+    def store(self, key, depth, flag, score, move):
+
+        i = key & self.mask
+        old = self.entries[i]
+
+        if old != 0 and self.keys[i] != key and old >> 53 == self.epoch:
+            if (old >> 46) & 63 == self.generation and (old >> 36) & 255 > depth:
+                return
+
+        move = 0 if move is None else move.id
+
+        # bits: move (16), score (20), depth (8), flag (2), generation (6), in use (1), epoch (11)
+        self.keys[i] = key
+        self.entries[i] = move | (score + self.SCORE_OFFSET) << 16 | min(depth, 255) << 36 | flag << 44 | \
+            self.generation << 46 | 1 << 52 | self.epoch << 53
+
+    # looks up a position, returning (depth, flag, score, move id) or None if it isn't stored
+    def probe(self, key):
+
+        i = key & self.mask
+        entry = self.entries[i]
+
+        if entry == 0 or self.keys[i] != key or entry >> 53 != self.epoch:
+            return None
+
+        return (entry >> 36) & 255, (entry >> 44) & 3, ((entry >> 16) & 0xFFFFF) - self.SCORE_OFFSET, entry & 0xFFFF
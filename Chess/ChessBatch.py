@@ -0,0 +1,143 @@
+"""
+James Verschleiser
+Analyses a file of FEN or EPD positions with a pool of worker processes and writes one JSON line per position
+
+usage: python -m Chess.ChessBatch INPUT OUTPUT [--depth N | --time MS] [--nodes N] [--workers N] [--resume]
+"""
+
+import argparse
+import collections
+import json
+import os
+import sys
+import time
+
+from Chess import ChessAI
+from Chess import ChessEngine
+from Chess import ChessWorker
+
+DEPTH = 3           # search depth when no depth, time or node limit is given
+IN_FLIGHT = 4       # positions queued per worker, so memory stays bounded however big the input is
+
+# searches one position in a worker and returns its result as a dictionary, scores are in centipawns from white's
+# point of view and a position that can't be read or searched gets an error instead (so one bad position doesn't end
+# the run), the AI starts each position fresh so a fixed depth result doesn't depend on which worker got the position
+# or what it searched before
+def analyse(index, fen, depth, time_limit, node_limit):
+
+    result = {"index": index, "fen": fen}
+    try:
+        ChessWorker.game.load_fen(fen)
+        maximize = ChessWorker.game.turn == "b"
+        ChessWorker.ai.clear()
+        ChessWorker.ai.nodes = 0
+        if time_limit is None and node_limit is None:
+            move = ChessWorker.ai.find_move(depth if depth else DEPTH, maximize)
+        else:
+            move = ChessWorker.ai.timed_find_move(time_limit, maximize, node_limit,
+                                                  depth if depth else ChessAI.MAX_DEPTH)
+    except ValueError as error:
+        result["error"] = str(error)
+        return result
+    except Exception as error:
+        result["error"] = "{}: {}".format(type(error).__name__, error)
+        return result
+
+    result["move"] = None if move is None else move.get_notation()
+    result["score"] = None if move is None else -ChessWorker.ai.best_score
+    result["depth"] = ChessWorker.ai.depth if move is not None else 0
+    result["nodes"] = ChessWorker.ai.nodes
+    return result
+
+
+# number of complete results already in the output file, a half written last line (from being stopped in the middle
+# of writing it) is cut off so the file can be appended to
+def completed(path):
+
+    if not os.path.exists(path):
+        return 0
+
+    count = 0
+    end = 0
+    with open(path, "rb") as file:
+        for line in file:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                json.loads(line)
+            except ValueError:
+                break
+            count += 1
+            end += len(line)
+
+    with open(path, "r+b") as file:
+        file.truncate(end)
+
+    return count
+
+
+# prints how far the run has got and how fast it is going
+def report(done, skipped, start, out):
+
+    seconds = time.perf_counter() - start
+    print("{} positions in {:.1f}s ({:.1f} positions/sec)".format(done, seconds, (done - skipped) / max(seconds, 1e-9)),
+          file=out)
+
+
+# analyses every position in input_path and writes the results to output_path in the same order, with resume the
+# positions already in the output are skipped and the new results are added on the end
+def run(input_path, output_path, depth=None, time_limit=None, node_limit=None, workers=None, resume=False,
+        tt_size=16, report_every=1000, out=sys.stderr):
+
+    workers = ChessWorker.count(workers)
+    skipped = completed(output_path) if resume else 0
+    done = skipped
+    start = time.perf_counter()
+
+    with open(input_path) as positions, open(output_path, "a" if resume else "w") as output, \
+            ChessWorker.pool(workers, tt_size) as pool:
+
+        pending = collections.deque()       # results waiting to be written, oldest first
+
+        for index, fen in enumerate(ChessEngine.fen_lines(positions)):
+            if index < skipped:
+                continue
+
+            pending.append(pool.submit(analyse, index, fen, depth, time_limit, node_limit))
+
+            # wait for the oldest position before queueing more once every worker has enough to do
+            while len(pending) >= workers * IN_FLIGHT or (pending and pending[0].done()):
+                output.write(json.dumps(pending.popleft().result()) + "\n")
+                done += 1
+                if done % report_every == 0:
+                    output.flush()
+                    report(done, skipped, start, out)
+
+        while pending:
+            output.write(json.dumps(pending.popleft().result()) + "\n")
+            done += 1
+
+    report(done, skipped, start, out)
+    return done
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="find the best move in every position of a FEN or EPD file")
+    parser.add_argument("input", help="file with one FEN or EPD position per line")
+    parser.add_argument("output", help="JSON lines file to write the results to")
+    parser.add_argument("--depth", type=int, help="search depth (the deepest to go with --time or --nodes)")
+    parser.add_argument("--time", type=int, help="milliseconds per position instead of a fixed depth")
+    parser.add_argument("--nodes", type=int, help="nodes per position instead of a fixed depth")
+    parser.add_argument("--workers", type=int, help="worker processes (defaults to one per core)")
+    parser.add_argument("--resume", action="store_true", help="carry on from the results already in the output")
+    parser.add_argument("--report", type=int, default=1000, help="print the speed every this many positions")
+    args = parser.parse_args(argv)
+
+    run(args.input, args.output, args.depth, args.time, args.nodes, args.workers, args.resume,
+        report_every=args.report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,218 @@
+"""
+James Verschleiser
+Opening book stored as a binary file of (position key, move, weight) entries sorted by key, looked up through mmap with
+a binary search so nothing has to be loaded when the book is opened
+
+usage: python -m Chess.ChessBook build OUTPUT INPUT... [--plies N] [--min-count N]
+       python -m Chess.ChessBook probe BOOK [--fen FEN]
+"""
+
+import argparse
+import collections
+import mmap
+import random
+import re
+import struct
+import sys
+
+from Chess import ChessEngine
+
+MAGIC = b"CHBK\x01\x00\x00\x00"        # start of every book file (the last bytes are the format version)
+ENTRY = struct.Struct(">QHH")           # zobrist key of the position, move id and weight
+MAX_WEIGHT = 65535
+
+RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+MOVE_NUMBER = re.compile(r"^\d+\.+")
+TOKEN = re.compile(r"[{}();]|[^\s{}();]+")      # PGN brackets and ; on their own, everything else split on spaces
+
+
+class Book:
+
+    def __init__(self, path, rng=None):
+
+        self.file = open(path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.data[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(path + " is not an opening book")
+
+        self.size = (len(self.data) - len(MAGIC)) // ENTRY.size       # number of entries
+        self.rng = rng if rng else random.Random()
+
+    # the (move id, weight) pairs stored for a position key
+    def entries(self, key):
+
+        # binary search for the first entry with this key
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            if ENTRY.unpack_from(self.data, len(MAGIC) + middle * ENTRY.size)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+
+        entries = []
+        while low < self.size:
+            entry_key, number, weight = ENTRY.unpack_from(self.data, len(MAGIC) + low * ENTRY.size)
+            if entry_key != key:
+                break
+            entries.append((number, weight))
+            low += 1
+
+        return entries
+
+    # the legal book moves in the game's position and their weights
+    def moves(self, game):
+
+        weights = dict(self.entries(game.key))
+        if not weights:
+            return []
+        return [(move, weights[move.id]) for move in game.all_moves() if weights.get(move.id)]
+
+    # picks a book move at random, moves played more often in the games the book was built from are picked more
+    # often, returns None when the position isn't in the book
+    def choose(self, game):
+
+        moves = self.moves(game)
+        if not moves:
+            return None
+
+        pick = self.rng.randrange(sum(weight for _, weight in moves))
+        for move, weight in moves:
+            pick -= weight
+            if pick < 0:
+                return move
+
+    def close(self):
+
+        if not self.data.closed:
+            self.data.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# splits PGN text into games, giving the list of moves (in algebraic notation) of each one, tags, comments,
+# variations and annotations are skipped
+def read_pgn(lines):
+
+    moves = []
+    comment = False     # inside a {} comment, which can go over several lines
+    variation = 0       # how many () variations deep the text is
+
+    for line in lines:
+        if not comment and variation == 0 and line.startswith("["):
+            continue
+
+        for token in TOKEN.findall(line):
+            if comment:
+                comment = token != "}"
+            elif token == "{":
+                comment = True
+            elif token == ";":
+                break
+            elif token == "(":
+                variation += 1
+            elif token == ")":
+                variation -= 1
+            elif variation > 0 or token.startswith("$"):
+                continue
+            elif token in RESULTS:
+                if moves:
+                    yield moves
+                moves = []
+            else:
+                token = MOVE_NUMBER.sub("", token)
+                if token:
+                    moves.append(token)
+
+    if moves:
+        yield moves
+
+
+# one game per line given as moves in coordinate or algebraic notation, move numbers are allowed
+def read_move_lists(lines):
+
+    for line in lines:
+        moves = [MOVE_NUMBER.sub("", token) for token in line.split() if token not in RESULTS]
+        moves = [move for move in moves if move]
+        if moves and not line.startswith("#"):
+            yield moves
+
+
+# counts how often each move was played in each position during the first plies of the games and writes the book,
+# moves seen fewer than min_count times are left out and the counts are scaled down if they don't fit in the weights
+def build(games, path, plies=20, min_count=1, out=sys.stderr):
+
+    counts = collections.Counter()
+    game = ChessEngine.Game()
+
+    for number, moves in enumerate(games):
+        game.load_fen(ChessEngine.START_FEN)
+        for text in moves[:plies]:
+            try:
+                move = game.parse_move(text)
+            except ValueError as error:
+                print("game {}: {}".format(number + 1, error), file=out)
+                break
+            counts[game.key, move.id] += 1
+            game.make_move(move)
+
+    entries = sorted((key, number, count) for (key, number), count in counts.items() if count >= min_count)
+    scale = max([1] + [count for _, _, count in entries]) / MAX_WEIGHT
+
+    with open(path, "wb") as file:
+        file.write(MAGIC)
+        for key, number, count in entries:
+            weight = count if scale <= 1 else max(1, int(count / scale))
+            file.write(ENTRY.pack(key, number, weight))
+
+    return len(entries)
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="build or look at an opening book")
+    commands = parser.add_subparsers(dest="command")
+
+    build_parser = commands.add_parser("build", help="build a book from PGN files or files of one game per line")
+    build_parser.add_argument("output")
+    build_parser.add_argument("inputs", nargs="+", help=".pgn files, anything else is read as one game per line")
+    build_parser.add_argument("--plies", type=int, default=20, help="how many moves into each game to use")
+    build_parser.add_argument("--min-count", type=int, default=1, help="leave out moves played fewer times")
+
+    probe_parser = commands.add_parser("probe", help="print the book moves of a position")
+    probe_parser.add_argument("book")
+    probe_parser.add_argument("--fen", default=ChessEngine.START_FEN)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+
+        def games():
+            for name in args.inputs:
+                with open(name) as file:
+                    yield from (read_pgn(file) if name.lower().endswith(".pgn") else read_move_lists(file))
+
+        print("{} entries".format(build(games(), args.output, args.plies, args.min_count)))
+
+    elif args.command == "probe":
+        game = ChessEngine.Game()
+        game.load_fen(args.fen)
+        with Book(args.book) as book:
+            for move, weight in sorted(book.moves(game), key=lambda pair: -pair[1]):
+                print(move.get_notation(), weight)
+
+    else:
+        parser.print_help()
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,6 +3,55 @@ James Verschleiser
 Engine that stores the game and determines move validity
 """
 
+import collections
+import random
+
+from Chess import ChessEval
+
+# the directions pieces move in as (row change, col change), the first four are straight and the last four diagonal
+DIRECTIONS = ((-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1))
+KNIGHT_JUMPS = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
+
+PAWN_DIRECTION = {"w": -1, "b": 1}      # white pawns move up the board and black pawns move down
+PAWN_START = {"w": 6, "b": 1}           # the row each side's pawns start on
+PROMOTIONS = ("Q", "R", "B", "N")       # pieces a pawn can promote to, best first
+SQUARES = tuple((row, col) for row in range(8) for col in range(8))      # (row, col) of each row * 8 + col
+PROMOTION_IDS = {piece: i << 12 for i, piece in enumerate(PROMOTIONS)}     # promotion bits of a packed move id
+
+# evaluation tables, see ChessEval
+MG_SCORES = ChessEval.MG_SCORES
+EG_SCORES = ChessEval.EG_SCORES
+PHASES = ChessEval.PHASES
+
+COLUMNS = "abcdefgh"
+PIECE_CHARS = {"--": ".", "wP": "P", "wN": "N", "wB": "B", "wR": "R", "wQ": "Q", "wK": "K",
+               "bP": "p", "bN": "n", "bB": "b", "bR": "r", "bQ": "q", "bK": "k"}       # one letter per square
+PIECE_NAMES = {char: name for name, char in PIECE_CHARS.items()}
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+# random numbers xor'ed together to make a key for each position, seeded so keys are the same every run
+zobrist_random = random.Random(2020)
+ZOBRIST_PIECES = {piece: [zobrist_random.getrandbits(64) for _ in range(64)]
+                  for piece in ("wP", "wN", "wB", "wR", "wQ", "wK", "bP", "bN", "bB", "bR", "bQ", "bK")}
+ZOBRIST_TURN = zobrist_random.getrandbits(64)       # added in when it is black's turn
+ZOBRIST_CASTLE = [zobrist_random.getrandbits(64) for _ in range(4)]     # wK, bK, wQ, bQ castle rights
+ZOBRIST_ENPASSANT = [zobrist_random.getrandbits(64) for _ in range(8)]  # the column en passant is possible on
+
+
+# the part of the key that comes from the castle rights
+def castle_key(castle):
+
+    key = 0
+    if castle.wK:
+        key ^= ZOBRIST_CASTLE[0]
+    if castle.bK:
+        key ^= ZOBRIST_CASTLE[1]
+    if castle.wQ:
+        key ^= ZOBRIST_CASTLE[2]
+    if castle.bQ:
+        key ^= ZOBRIST_CASTLE[3]
+    return key
+
 
 class Game:
     def __init__(self):
@@ -26,16 +75,56 @@ class Game:
         self.bK_location = (0, 4)     # black king current location
 
         self.enpassant = ()    # where en passant is possibleyeah
+        self.enpassant_log = []     # the en passant square before each move in the log
 
         self.castle = Castles(True, True, True, True)
         self.castle_log = [Castles(self.castle.wK, self.castle.bK, self.castle.wQ, self.castle.bQ)]
 
+        self.halfmove = 0       # moves since the last capture or pawn move
+        self.fullmove = 1       # number of the current move, goes up after black moves
+        self.halfmove_log = []      # the halfmove count before each move in the log
+
+        self.key = self.compute_key()       # zobrist key of the current position
+        self.key_log = []                   # the key before each move in the log
+
+        # evaluation kept up to date move by move: middlegame score, endgame score and game phase
+        self.mg, self.eg, self.phase = self.compute_eval()
+        self.eval_log = []                  # (mg, eg, phase) before each move in the log
+
+        self.debug = False      # check the key and evaluation against a full recompute after every move
+
         self.checkmate = False         # is the game currently in checkmate
         self.stalemate = False          # is the game currently in stalemate
 
+        self.pins = {}      # pinned pieces of the player to move while their moves are being generated
+
+        self.move_cache = None      # MoveCache of the legal moves of positions seen before, None to always generate
+
     # function that makes moves and changes where the pieces are located
     def make_move(self, move):
 
+        self.key_log.append(self.key)
+        self.enpassant_log.append(self.enpassant)
+        self.eval_log.append((self.mg, self.eg, self.phase))
+        self.halfmove_log.append(self.halfmove)
+
+        # the move counters, captures and pawn moves start the halfmove count again
+        if move.start_sq[1] == 'P' or move.end_sq != "--":
+            self.halfmove = 0
+        else:
+            self.halfmove += 1
+        if self.turn == 'b':
+            self.fullmove += 1
+
+        start = move.start_index
+        end = move.end_index
+
+        # take the old side to move, en passant and castle rights out of the key
+        key = self.key ^ ZOBRIST_TURN ^ self.enpassant_key() ^ castle_key(self.castle)
+        key ^= ZOBRIST_PIECES[move.start_sq][start]
+        if move.end_sq != "--" and not move.is_en_passant:
+            key ^= ZOBRIST_PIECES[move.end_sq][end]
+
         self.board[move.start[0]][move.start[1]] = "--"   # set the moved piece's square to empty
         self.board[move.end[0]][move.end[1]] = move.start_sq     # put the moved piece in the final location
 
@@ -50,12 +139,28 @@ class Game:
 
         # see if it is a pawn promotion
         if move.pawn_promotion:
-            new_piece = move.start_sq[0] + 'Q'
+            new_piece = move.start_sq[0] + move.promotion
             self.board[move.end[0]][move.end[1]] = new_piece
 
+        placed = self.board[move.end[0]][move.end[1]]
+        key ^= ZOBRIST_PIECES[placed][end]
+
+        # the evaluation loses the piece on its start square and gains what it became on the end square
+        mg = self.mg - MG_SCORES[move.start_sq][start] + MG_SCORES[placed][end]
+        eg = self.eg - EG_SCORES[move.start_sq][start] + EG_SCORES[placed][end]
+        self.phase += PHASES[placed] - PHASES[move.start_sq]
+
+        # and loses whatever was captured
+        if move.end_sq != "--":
+            captured = move.start[0] * 8 + move.end[1] if move.is_en_passant else end
+            mg -= MG_SCORES[move.end_sq][captured]
+            eg -= EG_SCORES[move.end_sq][captured]
+            self.phase -= PHASES[move.end_sq]
+
         # for en passant moves
         if move.is_en_passant:
             self.board[move.start[0]][move.end[1]] = '--'   # captured the pawn
+            key ^= ZOBRIST_PIECES[move.end_sq][move.start[0] * 8 + move.end[1]]
 
         # if the player made a two square push with a pawn
         if move.start_sq[1] == 'P' and (move.start[0] - move.end[0] == 2 or move.start[0] - move.end[0] == -2):
@@ -71,15 +176,33 @@ class Game:
         if move.k_castle:
             self.board[move.end[0]][move.end[1] - 1] = self.board[move.end[0]][move.end[1] + 1]
             self.board[move.end[0]][move.end[1] + 1] = '--'
+            rook = ZOBRIST_PIECES[move.start_sq[0] + 'R']
+            key ^= rook[end - 1] ^ rook[end + 1]
+            rook = move.start_sq[0] + 'R'
+            mg += MG_SCORES[rook][end - 1] - MG_SCORES[rook][end + 1]
+            eg += EG_SCORES[rook][end - 1] - EG_SCORES[rook][end + 1]
 
         elif move.q_castle:
             self.board[move.end[0]][move.end[1] + 1] = self.board[move.end[0]][move.end[1] - 2]
             self.board[move.end[0]][move.end[1] - 2] = '--'
+            rook = ZOBRIST_PIECES[move.start_sq[0] + 'R']
+            key ^= rook[end + 1] ^ rook[end - 2]
+            rook = move.start_sq[0] + 'R'
+            mg += MG_SCORES[rook][end + 1] - MG_SCORES[rook][end - 2]
+            eg += EG_SCORES[rook][end + 1] - EG_SCORES[rook][end - 2]
 
         # update your castle rights
         self.update_castle(move)
         self.castle_log.append(Castles(self.castle.wK, self.castle.bK, self.castle.wQ, self.castle.bQ))
 
+        # put the new castle rights and en passant back into the key
+        self.key = key ^ castle_key(self.castle) ^ self.enpassant_key()
+        self.mg = mg
+        self.eg = eg
+
+        if self.debug:
+            self.check_state()
+
     # function that lets the user undo moves or allows the engine to undo the moves it looked at
     def undo_move(self):
 
@@ -87,6 +210,10 @@ class Game:
         if len(self.log) != 0:
 
             move = self.log.pop()       # take the last made move and then undo its effects
+            if move is None:
+                self.undo_null_move()
+                return
+
             self.board[move.start[0]][move.start[1]] = move.start_sq
             self.board[move.end[0]][move.end[1]] = move.end_sq
             self.switch_turns()
@@ -101,11 +228,14 @@ class Game:
             if move.is_en_passant:
                 self.board[move.end[0]][move.end[1]] = '--'
                 self.board[move.start[0]][move.end[1]] = move.end_sq
-                self.enpassant = (move.end[0], move.end[1])
 
-            # undo a 2 sq pawn move
-            if move.start_sq[1] == 'P' and (move.start[0] - move.end[0] == 2 or move.start[0] - move.end[0] == -2):
-                self.enpassant = ()
+            # en passant goes back to what it was before the move
+            self.enpassant = self.enpassant_log.pop()
+            self.key = self.key_log.pop()
+            self.mg, self.eg, self.phase = self.eval_log.pop()
+            self.halfmove = self.halfmove_log.pop()
+            if self.turn == 'b':
+                self.fullmove -= 1
 
             # undo changes to castling
             self.castle_log.pop()
@@ -124,33 +254,336 @@ class Game:
                 self.board[move.end[0]][move.end[1] - 2] = self.board[move.end[0]][move.end[1] + 1]
                 self.board[move.end[0]][move.end[1] + 1] = '--'
 
-    # function that generates all the possible moves a player can make
+            if self.debug:
+                self.check_state()
+
+    # passes the turn without moving for the search's null move pruning, it goes in the log as None so undo_move takes
+    # it back like any other move, the halfmove count starts again so repetitions aren't looked for across it
+    def make_null_move(self):
+
+        self.key_log.append(self.key)
+        self.enpassant_log.append(self.enpassant)
+        self.halfmove_log.append(self.halfmove)
+
+        self.key ^= ZOBRIST_TURN ^ self.enpassant_key()
+        self.enpassant = ()
+        self.halfmove = 0
+        self.log.append(None)
+        self.switch_turns()
+
+    def undo_null_move(self):
+
+        self.switch_turns()
+        self.enpassant = self.enpassant_log.pop()
+        self.key = self.key_log.pop()
+        self.halfmove = self.halfmove_log.pop()
+
+    # does the player have anything other than pawns and the king
+    def has_pieces(self, color):
+
+        for row in self.board:
+            for square in row:
+                if square[0] == color and square[1] in "NBRQ":
+                    return True
+        return False
+
+    # sets up the position described by a FEN string (pieces, side to move, castle rights, en passant and the move
+    # counters), anything missing after the pieces gets the same default as in the starting position
+    def load_fen(self, fen):
+
+        fields = fen.split()
+        if len(fields) == 0:
+            raise ValueError("empty FEN")
+
+        # everything is read into locals first so a bad FEN leaves the game as it was
+        board = []
+        for rank in fields[0].split("/"):
+            row = []
+            for char in rank:
+                if char.isdigit():
+                    row.extend(["--"] * int(char))
+                elif char in PIECE_NAMES and char != ".":
+                    row.append(PIECE_NAMES[char])
+                else:
+                    raise ValueError("bad FEN board: " + fields[0])
+            board.append(row)
+
+        if len(board) != 8 or any(len(row) != 8 for row in board):
+            raise ValueError("bad FEN board: " + fields[0])
+        if sum(row.count("wK") for row in board) != 1 or sum(row.count("bK") for row in board) != 1:
+            raise ValueError("FEN needs one king of each color: " + fields[0])
+
+        if any(square[1] == "P" for square in board[0] + board[7]):
+            raise ValueError("FEN has a pawn on the first or last rank: " + fields[0])
+
+        turn = fields[1] if len(fields) > 1 else "w"
+        if turn not in ("w", "b"):
+            raise ValueError("bad FEN side to move: " + turn)
+
+        # the side that just moved can't have left its king in check
+        enemy = "b" if turn == "w" else "w"
+        row = next(row for row in range(8) if enemy + "K" in board[row])
+        if attacked(board, row, board[row].index(enemy + "K"), turn):
+            raise ValueError("FEN has the side not to move in check: " + fen)
+
+        # a right whose king or rook isn't on its starting square can't be used, so it is dropped
+        rights = fields[2] if len(fields) > 2 else "-"
+        if rights != "-" and (len(rights) == 0 or any(char not in "KQkq" for char in rights)):
+            raise ValueError("bad FEN castle rights: " + rights)
+        white = board[7][4] == "wK"
+        black = board[0][4] == "bK"
+        castle = Castles("K" in rights and white and board[7][7] == "wR",
+                         "k" in rights and black and board[0][7] == "bR",
+                         "Q" in rights and white and board[7][0] == "wR",
+                         "q" in rights and black and board[0][0] == "bR")
+
+        square = fields[3] if len(fields) > 3 else "-"
+        rank = "6" if turn == "w" else "3"         # the square the side that just moved skipped over
+        if square != "-" and (len(square) != 2 or square[0] not in COLUMNS or square[1] != rank):
+            raise ValueError("bad FEN en passant square: " + square)
+        enpassant = () if square == "-" else (8 - int(square[1]), COLUMNS.index(square[0]))
+
+        # the square is dropped unless a pawn of the side that just moved is in front of it with nothing behind it
+        if enpassant:
+            row, col = enpassant
+            forward = PAWN_DIRECTION[enemy]
+            if board[row + forward][col] != enemy + "P" or board[row][col] != "--" or board[row - forward][col] != "--":
+                enpassant = ()
+
+        try:
+            halfmove = int(fields[4]) if len(fields) > 4 else 0
+            fullmove = int(fields[5]) if len(fields) > 5 else 1
+        except ValueError:
+            raise ValueError("bad FEN move counters: " + " ".join(fields[4:]))
+
+        self.board = board
+        self.turn = turn
+        self.castle = castle
+        self.enpassant = enpassant
+        self.halfmove = halfmove
+        self.fullmove = fullmove
+        self.setup_position()
+
+    # the FEN string of the current position
+    def get_fen(self):
+
+        ranks = []
+        for row in self.board:
+            rank = ""
+            empty = 0
+            for square in row:
+                if square == "--":
+                    empty += 1
+                    continue
+                if empty:
+                    rank += str(empty)
+                    empty = 0
+                rank += PIECE_CHARS[square]
+            if empty:
+                rank += str(empty)
+            ranks.append(rank)
+
+        rights = ""
+        if self.castle.wK:
+            rights += "K"
+        if self.castle.wQ:
+            rights += "Q"
+        if self.castle.bK:
+            rights += "k"
+        if self.castle.bQ:
+            rights += "q"
+
+        square = square_name(self.enpassant) if self.enpassant else "-"
+
+        return " ".join(["/".join(ranks), self.turn, rights or "-", square, str(self.halfmove), str(self.fullmove)])
+
+    # finds the legal move written in coordinate notation (e2e4, e7e8q) or standard algebraic notation (e4, Nxf3,
+    # exd8=Q+, O-O), raises a ValueError if there isn't exactly one
+    def parse_move(self, text):
+
+        moves = self.all_moves()
+
+        for move in moves:
+            if move.get_notation() == text:
+                return move
+
+        san = text.rstrip("+#!?")
+        if san in ("O-O", "0-0"):
+            matches = [move for move in moves if move.k_castle]
+        elif san in ("O-O-O", "0-0-0"):
+            matches = [move for move in moves if move.q_castle]
+        else:
+            promotion = "Q"
+            if "=" in san:
+                san, promotion = san.split("=", 1)
+            elif san[-1:] in PROMOTIONS and san[:1].islower():
+                san, promotion = san[:-1], san[-1]
+
+            piece = san[0] if san and san[0] in "KQRBN" else "P"
+            if piece != "P":
+                san = san[1:]
+            san = san.replace("x", "").replace("-", "")
+            if len(san) < 2 or san[-2] not in COLUMNS or san[-1] not in "12345678":
+                raise ValueError("can't read move: " + text)
+
+            end = (8 - int(san[-1]), COLUMNS.index(san[-2]))
+            hint = san[:-2]         # file and/or rank the piece comes from when more than one could go there
+
+            matches = []
+            for move in moves:
+                if move.start_sq[1] != piece or move.end != end:
+                    continue
+                if move.pawn_promotion and move.promotion != promotion:
+                    continue
+                if any(move.start[1] != COLUMNS.index(char) if char in COLUMNS else move.start[0] != 8 - int(char)
+                       for char in hint if char in COLUMNS or char in "12345678"):
+                    continue
+                matches.append(move)
+
+        if len(matches) != 1:
+            raise ValueError(("no" if len(matches) == 0 else "ambiguous") + " move " + text + " in " + self.get_fen())
+        return matches[0]
+
+    # compact copy of the position (without its move history) that is cheap to send to another process
+    def snapshot(self):
+
+        board = "".join(PIECE_CHARS[square] for row in self.board for square in row)
+        castle = (self.castle.wK, self.castle.bK, self.castle.wQ, self.castle.bQ)
+        return board, self.turn, castle, self.enpassant, self.halfmove, self.fullmove
+
+    # sets up the position from a snapshot
+    def load_snapshot(self, snapshot):
+
+        board, self.turn, castle, self.enpassant, self.halfmove, self.fullmove = snapshot
+        self.board = [[PIECE_NAMES[char] for char in board[row * 8:row * 8 + 8]] for row in range(8)]
+        self.castle = Castles(*castle)
+
+        self.setup_position()
+
+    # finishes loading a new position: finds the kings and starts the logs, key and evaluation from scratch
+    def setup_position(self):
+
+        for row in range(8):
+            for col in range(8):
+                if self.board[row][col] == "wK":
+                    self.wK_location = (row, col)
+                elif self.board[row][col] == "bK":
+                    self.bK_location = (row, col)
+
+        # the loaded position has no history to undo
+        self.log = []
+        self.enpassant_log = []
+        self.castle_log = [Castles(self.castle.wK, self.castle.bK, self.castle.wQ, self.castle.bQ)]
+        self.key = self.compute_key()
+        self.key_log = []
+        self.mg, self.eg, self.phase = self.compute_eval()
+        self.eval_log = []
+        self.halfmove_log = []
+        self.checkmate = False
+        self.stalemate = False
+
+    # score of the position in centipawns from white's point of view, blended between middlegame and endgame
+    def evaluate(self):
+        return ChessEval.taper(self.mg, self.eg, self.phase)
+
+    # adds up the middlegame score, endgame score and phase of the whole board from scratch
+    def compute_eval(self):
+
+        mg = eg = phase = 0
+        for row in range(8):
+            for col in range(8):
+                piece = self.board[row][col]
+                if piece != "--":
+                    mg += MG_SCORES[piece][row * 8 + col]
+                    eg += EG_SCORES[piece][row * 8 + col]
+                    phase += PHASES[piece]
+
+        return mg, eg, phase
+
+    # debug check that the key and evaluation kept up to date move by move match the ones computed from scratch
+    def check_state(self):
+
+        if (self.mg, self.eg, self.phase) != self.compute_eval():
+            raise AssertionError("incremental evaluation {} does not match {}".format(
+                (self.mg, self.eg, self.phase), self.compute_eval()))
+        if self.key != self.compute_key():
+            raise AssertionError("incremental key {} does not match {}".format(self.key, self.compute_key()))
+
+    # builds the zobrist key of the current position from scratch
+    def compute_key(self):
+
+        key = 0
+        for row in range(8):
+            for col in range(8):
+                if self.board[row][col] != "--":
+                    key ^= ZOBRIST_PIECES[self.board[row][col]][row * 8 + col]
+
+        if self.turn == "b":
+            key ^= ZOBRIST_TURN
+
+        return key ^ castle_key(self.castle) ^ self.enpassant_key()
+
+    # the part of the key from en passant, only counted if the player to move has a pawn that could take en passant
+    def enpassant_key(self):
+
+        if self.enpassant == ():
+            return 0
+
+        row, col = self.enpassant
+        row -= PAWN_DIRECTION[self.turn]      # the row the capturing pawns would be on
+        pawn = self.turn + 'P'
+
+        if (col - 1 >= 0 and self.board[row][col - 1] == pawn) or (col + 1 <= 7 and self.board[row][col + 1] == pawn):
+            return ZOBRIST_ENPASSANT[col]
+        return 0
+
+    # the legal moves of the current position, taken from the move cache when the position is in it
     def all_moves(self):
 
-        enpassant = self.enpassant      # saves current value before generating all the moves
-        castle = Castles(self.castle.wK, self.castle.bK, self.castle.wQ, self.castle.bQ)
+        cache = self.move_cache
+        if cache is None:
+            return self.generate_moves()
+
+        entry = cache.get(self.key)
+        if entry is None:
+            moves = self.generate_moves()
+            cache.put(self.key, (moves, self.checkmate, self.stalemate))
+        else:
+            moves, self.checkmate, self.stalemate = entry
+
+        return list(moves)      # a copy, callers sort and reorder the list they get
 
-        moves = self.valid_moves()      # generate all moves that can be done by the directionality of the pieces
+    # function that generates all the possible moves a player can make
+    def generate_moves(self):
+
+        self.pins, checks = self.pins_and_checks()      # find the pins and checks once for the whole position
 
         if self.turn == "w":
-            self.castle_moves(self.wK_location[0], self.wK_location[1], moves)
+            king_row, king_col = self.wK_location
         else:
-            self.castle_moves(self.bK_location[0], self.bK_location[1], moves)
+            king_row, king_col = self.bK_location
 
-        for i in range(len(moves) - 1, -1, -1):    # for each of these moves
+        if len(checks) > 1:         # in double check only the king can move
+            moves = []
+            self.king_moves(king_row, king_col, moves)
 
-            self.make_move(moves[i])        # make the move
-            self.switch_turns()             # make_move changed turn to the opponent so now change back
+        else:
+            moves = self.valid_moves()      # generate all moves that can be done without breaking a pin
 
-            if self.in_check():          # we can't allow moves that leave the king able to be taken
-                moves.remove(moves[i])
+            if len(checks) == 1:        # the king moves away, the checker is captured or the check is blocked
+                block = self.block_squares(king_row, king_col, checks[0])
+                moves = [move for move in moves if move.start_sq[1] == 'K' or move.end in block or move.is_en_passant]
+            else:
+                self.castle_moves(king_row, king_col, moves)
 
-            self.switch_turns()     # switch back the turn so the opponent can move
+            # en passant takes two pieces off the same row so it is checked by making the move
+            if self.enpassant != ():
+                moves = [move for move in moves if not move.is_en_passant or self.en_passant_legal(move)]
 
-            self.undo_move()        # undo the move
+        self.pins = {}
 
         if len(moves) == 0:             # if we can't make any moves then either checkmate or stalemate
-            if self.in_check():          # it is checkmate if the king is attacked and stalemate otherwise
+            if len(checks) != 0:          # it is checkmate if the king is attacked and stalemate otherwise
                 self.checkmate = True
             else:
                 self.stalemate = True
@@ -159,11 +592,147 @@ class Game:
             self.checkmate = False
             self.stalemate = False
 
-        self.enpassant = enpassant
-        self.castle = castle
+        return moves
+
+    # generates only the legal captures and promotions, without spending any time on quiet moves
+    def capture_moves(self):
+
+        self.pins, checks = self.pins_and_checks()
+        moves = []
+
+        if self.turn == "w":
+            king_row, king_col = self.wK_location
+        else:
+            king_row, king_col = self.bK_location
+
+        if len(checks) > 1:         # in double check only the king can capture
+            self.king_captures(king_row, king_col, moves)
+
+        else:
+            for row in range(8):
+                for col in range(8):
+                    piece = self.board[row][col]
+                    if piece[0] == self.turn:
+                        if piece[1] == 'P':
+                            self.pawn_captures(row, col, moves)
+                        elif piece[1] == 'N':
+                            self.knight_captures(row, col, moves)
+                        elif piece[1] == 'B':
+                            self.slide_captures(row, col, DIRECTIONS[4:], moves)
+                        elif piece[1] == 'R':
+                            self.slide_captures(row, col, DIRECTIONS[:4], moves)
+                        elif piece[1] == 'Q':
+                            self.slide_captures(row, col, DIRECTIONS, moves)
+                        elif piece[1] == 'K':
+                            self.king_captures(row, col, moves)
+
+            if len(checks) == 1:        # in check a capture has to take the checking piece (or block by promoting)
+                block = self.block_squares(king_row, king_col, checks[0])
+                moves = [move for move in moves if move.start_sq[1] == 'K' or move.end in block or move.is_en_passant]
+
+            if self.enpassant != ():
+                moves = [move for move in moves if not move.is_en_passant or self.en_passant_legal(move)]
+
+        self.pins = {}
 
         return moves
 
+    # finds the current player's pinned pieces and the pieces giving check by looking out from the king
+    def pins_and_checks(self):
+
+        pins = {}       # pinned piece's square -> direction from the king to the pinned piece
+        checks = []     # (row, col, row direction, col direction) of every checking piece
+
+        if self.turn == "w":
+            ally, enemy = "w", "b"
+            row, col = self.wK_location
+        else:
+            ally, enemy = "b", "w"
+            row, col = self.bK_location
+
+        for j in range(len(DIRECTIONS)):
+            dr, dc = DIRECTIONS[j]
+            possible_pin = ()
+            r, c = row + dr, col + dc
+            i = 1
+
+            while 0 <= r <= 7 and 0 <= c <= 7:
+                piece = self.board[r][c]
+
+                if piece[0] == ally:
+                    if possible_pin != ():      # a second piece of ours in the way means no pin
+                        break
+                    possible_pin = (r, c)
+
+                elif piece[0] == enemy:
+                    kind = piece[1]
+
+                    # the enemy piece has to be able to attack along this direction
+                    if kind == 'Q' or (j < 4 and kind == 'R') or (j >= 4 and kind == 'B') or \
+                            (i == 1 and kind == 'P' and j >= 4 and dr == PAWN_DIRECTION[ally]):
+                        if possible_pin == ():
+                            checks.append((r, c, dr, dc))
+                        else:
+                            pins[possible_pin] = (dr, dc)
+                    break
+
+                r += dr
+                c += dc
+                i += 1
+
+        for dr, dc in KNIGHT_JUMPS:
+            r, c = row + dr, col + dc
+            if 0 <= r <= 7 and 0 <= c <= 7 and self.board[r][c] == enemy + 'N':
+                checks.append((r, c, dr, dc))
+
+        return pins, checks
+
+    # the squares a piece can move to in order to stop the given check
+    def block_squares(self, row, col, check):
+
+        check_row, check_col, dr, dc = check
+
+        if self.board[check_row][check_col][1] == 'N':    # a knight check can only be stopped by taking the knight
+            return {(check_row, check_col)}
+
+        block = set()
+        r, c = row + dr, col + dc
+        while (r, c) != (check_row, check_col):
+            block.add((r, c))
+            r += dr
+            c += dc
+        block.add((check_row, check_col))
+
+        return block
+
+    # makes an en passant move to see if it leaves the king in check
+    def en_passant_legal(self, move):
+
+        self.make_move(move)
+        self.switch_turns()             # make_move changed turn to the opponent so now change back
+        legal = not self.in_check()
+        self.switch_turns()
+        self.undo_move()
+
+        return legal
+
+    # how many times the current position came up before, only going back to the last capture or pawn move since
+    # nothing before that can be the same position again (and only to the positions with the same side to move)
+    def repetitions(self):
+
+        count = 0
+        last = len(self.key_log)
+        for i in range(last - 2, max(last - self.halfmove, 0) - 1, -2):
+            if self.key_log[i] == self.key:
+                count += 1
+        return count
+
+    # is the game drawn by the fifty move rule or by the position coming up for the third time, the search passes
+    # repetitions=1 to treat any repeat as a draw since a side that can repeat once can keep repeating (it takes at
+    # least 4 moves to get back to a position so the history isn't looked at before then)
+    def is_draw(self, repetitions=2):
+        return self.halfmove >= 100 or (self.halfmove >= 4 and self.repetitions() >= repetitions)
+
     # Is current player in check
     def in_check(self):
 
@@ -172,20 +741,9 @@ class Game:
         else:
             return self.square_attacked(self.bK_location[0], self.bK_location[1])
 
-    # Is square that we are trying to move to being attacked
+    # Is square attacked by the opponent
     def square_attacked(self, row, col):
-
-        self.switch_turns()   # switch and make it the opponent's turn
-
-        opp_moves = self.valid_moves()      # calculate all of the opponent's moves
-
-        self.switch_turns()         # back to current player's turn
-
-        # check if any of the moves the opponent makes involves capturing the king
-        for move in opp_moves:
-            if move.end[0] == row and move.end[1] == col:
-                return True
-        return False
+        return attacked(self.board, row, col, "b" if self.turn == "w" else "w")
 
     # if the player makes a move that invalidates a castle move
     def update_castle(self, move):
@@ -216,6 +774,16 @@ class Game:
                 if move.start[1] == 7:
                     self.castle.bK = False
 
+        # a rook captured on its starting square can't castle anymore
+        if move.end == (7, 0):
+            self.castle.wQ = False
+        elif move.end == (7, 7):
+            self.castle.wK = False
+        elif move.end == (0, 0):
+            self.castle.bQ = False
+        elif move.end == (0, 7):
+            self.castle.bK = False
+
     # generates all of the moves that are possible solely based on where the pieces are able to move
     def valid_moves(self):
 
@@ -247,159 +815,52 @@ class Game:
     # generate all possible pawn moves
     def pawn_moves(self, row, col, moves):
 
-        if self.turn == 'w':
-            if self.board[row - 1][col] == "--":
-                moves.append(Move((row, col), (row - 1, col), self.board))
-                if row == 6:
-                    if self.board[row - 2][col] == "--":
-                        moves.append(Move((row, col), (row - 2, col), self.board))
-            if col - 1 >= 0:
-                if self.board[row - 1][col - 1][0] == 'b':
-                    moves.append(Move((row, col), (row - 1, col - 1), self.board))
-                elif (row - 1, col - 1) == self.enpassant:
-                    moves.append(Move((row, col), (row - 1, col - 1), self.board, en_passant=True))
-            if col + 1 <= 7:
-                if self.board[row - 1][col + 1][0] == 'b':
-                    moves.append(Move((row, col), (row - 1, col + 1), self.board))
-                elif (row - 1, col + 1) == self.enpassant:
-                    moves.append(Move((row, col), (row - 1, col + 1), self.board, en_passant=True))
-
+        pin = self.pins.get((row, col))
+        step = PAWN_DIRECTION[self.turn]
+        enemy = "b" if self.turn == "w" else "w"
+
+        # pushes can only be made if the pawn isn't pinned or is pinned along its column
+        if self.board[row + step][col] == "--" and (pin is None or pin[1] == 0):
+            self.add_pawn_move((row, col), (row + step, col), moves)
+            if row == PAWN_START[self.turn]:
+                if self.board[row + 2 * step][col] == "--":
+                    moves.append(Move((row, col), (row + 2 * step, col), self.board))
+
+        # captures can only be made if the pawn isn't pinned or is pinned along the capture diagonal
+        for dc in (-1, 1):
+            if 0 <= col + dc <= 7 and (pin is None or pin == (step, dc) or pin == (-step, -dc)):
+                if self.board[row + step][col + dc][0] == enemy:
+                    self.add_pawn_move((row, col), (row + step, col + dc), moves)
+                elif (row + step, col + dc) == self.enpassant:
+                    moves.append(Move((row, col), (row + step, col + dc), self.board, en_passant=True))
+
+    # adds a pawn move, or one move for each piece it can promote to if it reaches the last row
+    def add_pawn_move(self, start, end, moves):
+
+        if end[0] == 0 or end[0] == 7:
+            for piece in PROMOTIONS:
+                moves.append(Move(start, end, self.board, promotion=piece))
         else:
-            if self.board[row + 1][col] == "--":
-                moves.append(Move((row, col), (row + 1, col), self.board))
-                if row == 1:
-                    if self.board[row + 2][col] == "--":
-                        moves.append(Move((row, col), (row + 2, col), self.board))
-            if col - 1 >= 0:
-                if self.board[row + 1][col - 1][0] == 'w':
-                    moves.append(Move((row, col), (row + 1, col - 1), self.board))
-                elif (row + 1, col - 1) == self.enpassant:
-                    moves.append(Move((row, col), (row + 1, col - 1), self.board, en_passant=True))
-            if col + 1 <= 7:
-                if self.board[row + 1][col + 1][0] == 'w':
-                    moves.append(Move((row, col), (row + 1, col + 1), self.board))
-                elif (row + 1, col + 1) == self.enpassant:
-                    moves.append(Move((row, col), (row + 1, col + 1), self.board, en_passant=True))
+            moves.append(Move(start, end, self.board))
 
     # generate all possible rook moves
     def rook_moves(self, row, col, moves):
-
-        i = 1
-
-        while row - 1 >= 0:
-            if self.board[row - i][col][0] != self.board[row][col][0]:
-                moves.append(Move((row, col), (row - i, col), self.board))
-                if self.board[row - i][col][0] != "-":
-                    break
-                i += 1
-            else:
-                break
-        i = 1
-        while row + i <= 7:
-            if self.board[row + i][col][0] != self.board[row][col][0]:
-                moves.append(Move((row, col), (row + i, col), self.board))
-                if self.board[row - i][col][0] != "-":
-                    break
-                i += 1
-            else:
-                break
-
-        i = 1
-        while col - i >= 0:
-            if self.board[row][col - i][0] != self.board[row][col][0]:
-                moves.append(Move((row, col), (row, col - i), self.board))
-                if self.board[row][col - i][0] != "-":
-                    break
-                i += 1
-            else:
-                break
-        i = 1
-        while col + i <= 7:
-            if self.board[row][col + i][0] != self.board[row][col][0]:
-                moves.append(Move((row, col), (row, col + i), self.board))
-                if self.board[row][col + i][0] != "-":
-                    break
-                i += 1
-            else:
-                break
+        self.slide_moves(row, col, DIRECTIONS[:4], moves)
 
     # generate all possible knight moves
     def knight_moves(self, row, col, moves):
 
-        if row - 2 >= 0 and col + 1 <= 7:
-            if self.board[row - 2][col + 1][0] != self.board[row][col][0]:
-                moves.append(Move((row, col), (row - 2, col + 1), self.board))
-
-        if row - 2 >= 0 and col - 1 >= 0:
-            if self.board[row - 2][col - 1][0] != self.board[row][col][0]:
-                moves.append(Move((row, col), (row - 2, col - 1), self.board))
-
-        if row + 2 <= 7 and col - 1 >= 0:
-            if self.board[row + 2][col - 1][0] != self.board[row][col][0]:
-                moves.append(Move((row, col), (row + 2, col - 1), self.board))
-
-        if row + 2 <= 7 and col + 1 <= 7:
-            if self.board[row + 2][col + 1][0] != self.board[row][col][0]:
-                moves.append(Move((row, col), (row + 2, col + 1), self.board))
-
-        if row - 1 >= 0 and col + 2 <= 7:
-            if self.board[row - 1][col + 2][0] != self.board[row][col][0]:
-                moves.append(Move((row, col), (row - 1, col + 2), self.board))
-
-        if row - 1 >= 0 and col - 2 >= 0:
-            if self.board[row - 1][col - 2][0] != self.board[row][col][0]:
-                moves.append(Move((row, col), (row - 1, col - 2), self.board))
-
-        if row + 1 <= 7 and col - 2 >= 0:
-            if self.board[row + 1][col - 2][0] != self.board[row][col][0]:
-                moves.append(Move((row, col), (row + 1, col - 2), self.board))
+        if (row, col) in self.pins:       # a pinned knight can never move
+            return
 
-        if row + 1 <= 7 and col + 2 <= 7:
-            if self.board[row + 1][col + 2][0] != self.board[row][col][0]:
-                moves.append(Move((row, col), (row + 1, col + 2), self.board))
+        for dr, dc in KNIGHT_JUMPS:
+            if 0 <= row + dr <= 7 and 0 <= col + dc <= 7:
+                if self.board[row + dr][col + dc][0] != self.board[row][col][0]:
+                    moves.append(Move((row, col), (row + dr, col + dc), self.board))
 
     # generate all possible bishop moves
     def bishop_moves(self, row, col, moves):
-
-        i = 1
-        while 7 >= row - i >= 0 and 7 >= col - i >= 0:
-            if self.board[row - i][col - i][0] != self.board[row][col][0]:
-                moves.append(Move((row, col), (row - i, col - i), self.board))
-                if self.board[row - i][col - i][0] != "-":
-                    break
-                i += 1
-            else:
-                break
-
-        i = 1
-        while 7 >= row + i >= 0 and 7 >= col + i >= 0:
-            if self.board[row + i][col + i][0] != self.board[row][col][0]:
-                moves.append(Move((row, col), (row + i, col + i), self.board))
-                if self.board[row + i][col + i][0] != "-":
-                    break
-                i += 1
-            else:
-                break
-
-        i = 1
-        while 7 >= row + i >= 0 and 7 >= col - i >= 0:
-            if self.board[row + i][col - i][0] != self.board[row][col][0]:
-                moves.append(Move((row, col), (row + i, col - i), self.board))
-                if self.board[row + i][col - i][0] != "-":
-                    break
-                i += 1
-            else:
-                break
-
-        i = 1
-        while 7 >= row - i >= 0 and 7 >= col + i >= 0:
-            if self.board[row - i][col + i][0] != self.board[row][col][0]:
-                moves.append(Move((row, col), (row - i, col + i), self.board))
-                if self.board[row - i][col + i][0] != "-":
-                    break
-                i += 1
-            else:
-                break
+        self.slide_moves(row, col, DIRECTIONS[4:], moves)
 
     # rook can move the same as a rook and bishop combined
     def queen_moves(self, row, col, moves):
@@ -407,64 +868,120 @@ class Game:
         self.rook_moves(row, col, moves)
         self.bishop_moves(row, col, moves)
 
-    # generate the king moves
-    def king_moves(self, row, col, moves):
-
-        if row - 1 >= 0 and col + 1 <= 7:
-            if self.board[row - 1][col + 1][0] != self.board[row][col][0]:
-                moves.append(Move((row, col), (row - 1, col + 1), self.board))
+    # moves a piece along each direction until it hits a piece, a pinned piece can only slide along its pin
+    def slide_moves(self, row, col, directions, moves):
 
-        if row - 1 >= 0 and col - 1 >= 0:
-            if self.board[row - 1][col - 1][0] != self.board[row][col][0]:
-                moves.append(Move((row, col), (row - 1, col - 1), self.board))
+        pin = self.pins.get((row, col))
+        ally = self.board[row][col][0]
 
-        if row + 1 <= 7 and col - 1 >= 0:
-            if self.board[row + 1][col - 1][0] != self.board[row][col][0]:
-                moves.append(Move((row, col), (row + 1, col - 1), self.board))
+        for dr, dc in directions:
+            if pin is not None and pin != (dr, dc) and pin != (-dr, -dc):
+                continue
 
-        if row + 1 <= 7 and col + 1 <= 7:
-            if self.board[row + 1][col + 1][0] != self.board[row][col][0]:
-                moves.append(Move((row, col), (row + 1, col + 1), self.board))
+            r, c = row + dr, col + dc
+            while 0 <= r <= 7 and 0 <= c <= 7:
+                if self.board[r][c][0] == ally:
+                    break
+                moves.append(Move((row, col), (r, c), self.board))
+                if self.board[r][c] != "--":
+                    break
+                r += dr
+                c += dc
 
-        if row - 1 >= 0:
-            if self.board[row - 1][col][0] != self.board[row][col][0]:
-                moves.append(Move((row, col), (row - 1, col), self.board))
+    # generate the king moves that don't walk into an attack
+    def king_moves(self, row, col, moves):
 
-        if row + 1 <= 7:
-            if self.board[row + 1][col][0] != self.board[row][col][0]:
-                moves.append(Move((row, col), (row + 1, col), self.board))
+        king = self.board[row][col]
+        self.board[row][col] = "--"     # lift the king so sliders attacking it still see the squares behind it
 
-        if col - 1 >= 0:
-            if self.board[row][col - 1][0] != self.board[row][col][0]:
-                moves.append(Move((row, col), (row, col - 1), self.board))
+        for dr, dc in DIRECTIONS:
+            r, c = row + dr, col + dc
+            if 0 <= r <= 7 and 0 <= c <= 7 and self.board[r][c][0] != king[0]:
+                if not self.square_attacked(r, c):
+                    self.board[row][col] = king
+                    moves.append(Move((row, col), (r, c), self.board))
+                    self.board[row][col] = "--"
 
-        if col + 1 <= 7:
-            if self.board[row][col + 1][0] != self.board[row][col][0]:
-                moves.append(Move((row, col), (row, col + 1), self.board))
+        self.board[row][col] = king
 
     # generate possible castle moves
     def castle_moves(self, row, col, moves):
         if self.square_attacked(row, col):
             return
-        if self.turn == 'w' and self.castle.wK:
-            if self.board[row][col + 1] == '--' and self.board[row][col + 2] == '--':
-                if not self.square_attacked(row, col + 1) and not self.square_attacked(row, col + 2):
-                    moves.append(Move((row, col), (row, col + 2), self.board, k_castle=True))
-
-        if self.turn == 'b' and self.castle.bK:
+        if (self.turn == 'w' and self.castle.wK) or (self.turn == 'b' and self.castle.bK):
             if self.board[row][col + 1] == '--' and self.board[row][col + 2] == '--':
                 if not self.square_attacked(row, col + 1) and not self.square_attacked(row, col + 2):
                     moves.append(Move((row, col), (row, col + 2), self.board, k_castle=True))
 
-        if self.turn == 'w' and self.castle.wQ:
+        if (self.turn == 'w' and self.castle.wQ) or (self.turn == 'b' and self.castle.bQ):
             if self.board[row][col - 1] == '--' and self.board[row][col - 2] == '--' and self.board[row][col - 3] == '--':
                 if not self.square_attacked(row, col - 1) and not self.square_attacked(row, col - 2):
                     moves.append(Move((row, col), (row, col - 2), self.board, q_castle=True))
 
-        if self.turn == 'b' and self.castle.bQ:
-            if self.board[row][col - 1] == '--' and self.board[row][col - 2] == '--' and self.board[row][col - 3] == '--':
-                if not self.square_attacked(row, col - 1) and not self.square_attacked(row, col - 2):
-                    moves.append(Move((row, col), (row, col - 2), self.board, q_castle=True))
+    # pawn captures, en passant and pushes that promote
+    def pawn_captures(self, row, col, moves):
+
+        pin = self.pins.get((row, col))
+        step = PAWN_DIRECTION[self.turn]
+        enemy = "b" if self.turn == "w" else "w"
+
+        if (row + step == 0 or row + step == 7) and self.board[row + step][col] == "--" and \
+                (pin is None or pin[1] == 0):
+            self.add_pawn_move((row, col), (row + step, col), moves)
+
+        for dc in (-1, 1):
+            if 0 <= col + dc <= 7 and (pin is None or pin == (step, dc) or pin == (-step, -dc)):
+                if self.board[row + step][col + dc][0] == enemy:
+                    self.add_pawn_move((row, col), (row + step, col + dc), moves)
+                elif (row + step, col + dc) == self.enpassant:
+                    moves.append(Move((row, col), (row + step, col + dc), self.board, en_passant=True))
+
+    # knight jumps that land on an enemy piece
+    def knight_captures(self, row, col, moves):
+
+        if (row, col) in self.pins:
+            return
+
+        enemy = "b" if self.turn == "w" else "w"
+        for dr, dc in KNIGHT_JUMPS:
+            if 0 <= row + dr <= 7 and 0 <= col + dc <= 7 and self.board[row + dr][col + dc][0] == enemy:
+                moves.append(Move((row, col), (row + dr, col + dc), self.board))
+
+    # slides along each direction to the first piece and takes it if it is an enemy
+    def slide_captures(self, row, col, directions, moves):
+
+        pin = self.pins.get((row, col))
+        enemy = "b" if self.turn == "w" else "w"
+
+        for dr, dc in directions:
+            if pin is not None and pin != (dr, dc) and pin != (-dr, -dc):
+                continue
+
+            r, c = row + dr, col + dc
+            while 0 <= r <= 7 and 0 <= c <= 7:
+                if self.board[r][c] != "--":
+                    if self.board[r][c][0] == enemy:
+                        moves.append(Move((row, col), (r, c), self.board))
+                    break
+                r += dr
+                c += dc
+
+    # king captures of pieces that aren't defended
+    def king_captures(self, row, col, moves):
+
+        king = self.board[row][col]
+        enemy = "b" if self.turn == "w" else "w"
+        self.board[row][col] = "--"
+
+        for dr, dc in DIRECTIONS:
+            r, c = row + dr, col + dc
+            if 0 <= r <= 7 and 0 <= c <= 7 and self.board[r][c][0] == enemy:
+                if not self.square_attacked(r, c):
+                    self.board[row][col] = king
+                    moves.append(Move((row, col), (r, c), self.board))
+                    self.board[row][col] = "--"
+
+        self.board[row][col] = king
 
     # switch whose turn it is
     def switch_turns(self):
@@ -476,36 +993,191 @@ class Game:
 
 
 # class that stores the details of a specific move
+# slots instead of a __dict__ keep the many moves made by the search small and quick to create
 class Move:
-    def __init__(self, start, end, board, en_passant=False, k_castle=False, q_castle=False):
-        self.start = start
-        self.end = end
-        self.start_sq = board[self.start[0]][self.start[1]]     # piece on start square
-        self.end_sq = board[self.end[0]][self.end[1]]           # piece on end square
+    __slots__ = ("start", "end", "start_index", "end_index", "start_sq", "end_sq", "pawn_promotion", "promotion",
+                 "is_en_passant", "k_castle", "q_castle", "id")
 
-        self.pawn_promotion = False        # stores if the move involves a pawn promotion
+    def __init__(self, start, end, board, en_passant=False, k_castle=False, q_castle=False, promotion='Q'):
+        self.start_index = start_index = start[0] * 8 + start[1]        # squares as row * 8 + col
+        self.end_index = end_index = end[0] * 8 + end[1]
+        self.start = SQUARES[start_index]       # every move shares the same 64 square tuples
+        self.end = SQUARES[end_index]
+        self.start_sq = piece = board[start[0]][start[1]]       # piece on start square
+        self.end_sq = board[end[0]][end[1]]                     # piece on end square
 
-        # sees if move is a pawn promotion
-        if self.start_sq == 'wP' and self.end[0] == 0:
-            self.pawn_promotion = True
-
-        if self.start_sq == 'bP' and self.end[0] == 7:
-            self.pawn_promotion = True
+        # sees if move is a pawn promotion and stores the piece the pawn becomes if it is
+        self.pawn_promotion = (piece == 'wP' and end[0] == 0) or (piece == 'bP' and end[0] == 7)
+        self.promotion = promotion
 
         self.is_en_passant = en_passant     # if the move is an en passant
 
-        if self.is_en_passant:
-            if self.start_sq == 'wP':
-                self.end_sq = 'bP'
-            else:
-                self.end_sq = 'wP'
+        if en_passant:
+            self.end_sq = 'bP' if piece == 'wP' else 'wP'
 
         self.k_castle = k_castle
         self.q_castle = q_castle
 
+        # start and end square and promotion packed into one number, 0 is never a move
+        if self.pawn_promotion:
+            self.id = PROMOTION_IDS[promotion] | start_index << 6 | end_index
+        else:
+            self.id = start_index << 6 | end_index
+
+    # moves are equal if they go between the same squares (and promote to the same piece), the other flags follow
+    # from the position so a move typed in by the user matches the generated one
+    def __eq__(self, other):
+        return isinstance(other, Move) and self.id == other.id
+
+    def __hash__(self):
+        return self.id
+
     def print_move(self):
         return self.start, self.end
 
+    # the move in coordinate notation like e2e4 or e7e8q
+    def get_notation(self):
+
+        notation = square_name(self.start) + square_name(self.end)
+        if self.pawn_promotion:
+            notation += self.promotion.lower()
+        return notation
+
+
+# is the square attacked by a piece of the enemy color, found by looking outwards from the square for pieces that
+# could attack it
+def attacked(board, row, col, enemy):
+
+    # knights
+    for dr, dc in KNIGHT_JUMPS:
+        r, c = row + dr, col + dc
+        if 0 <= r <= 7 and 0 <= c <= 7 and board[r][c] == enemy + 'N':
+            return True
+
+    # pawns attack diagonally towards the square from the row behind it
+    r = row - PAWN_DIRECTION[enemy]
+    if 0 <= r <= 7:
+        if col - 1 >= 0 and board[r][col - 1] == enemy + 'P':
+            return True
+        if col + 1 <= 7 and board[r][col + 1] == enemy + 'P':
+            return True
+
+    # kings
+    for dr, dc in DIRECTIONS:
+        r, c = row + dr, col + dc
+        if 0 <= r <= 7 and 0 <= c <= 7 and board[r][c] == enemy + 'K':
+            return True
+
+    # rooks and bishops (and queens) along the rays until the first piece
+    for j in range(len(DIRECTIONS)):
+        dr, dc = DIRECTIONS[j]
+        r, c = row + dr, col + dc
+
+        while 0 <= r <= 7 and 0 <= c <= 7:
+            piece = board[r][c]
+            if piece != "--":
+                if piece[0] == enemy and (piece[1] == 'Q' or piece[1] == ('R' if j < 4 else 'B')):
+                    return True
+                break
+            r += dr
+            c += dc
+
+    return False
+
+
+# turns a packed move id back into the move it stands for in the given board
+def decode_move(number, board):
+
+    start = (number >> 9 & 7, number >> 6 & 7)
+    end = (number >> 3 & 7, number & 7)
+    piece = board[start[0]][start[1]]
+
+    k_castle = piece[1] == "K" and end[1] - start[1] == 2
+    q_castle = piece[1] == "K" and start[1] - end[1] == 2
+    en_passant = piece[1] == "P" and start[1] != end[1] and board[end[0]][end[1]] == "--"
+
+    return Move(start, end, board, en_passant, k_castle, q_castle, PROMOTIONS[number >> 12 & 3])
+
+
+# goes through a file (or any lines) of FEN positions one at a time, setting up the same game for each one so large
+# files never have to be held in memory, blank lines and lines starting with # are skipped and EPD operations are
+# ignored (see fen_lines), copy the game to keep a position after moving on to the next one
+def read_fens(lines, game=None):
+
+    if isinstance(lines, str):
+        with open(lines) as file:
+            yield from read_fens(file, game)
+        return
+
+    if game is None:
+        game = Game()
+
+    for fen in fen_lines(lines):
+        game.load_fen(fen)
+        yield game
+
+
+# the FEN strings in some lines, skipping blank lines and # comments, EPD lines have operations like "bm Bb5; id x;"
+# after the first four fields instead of the move counters, so the fields after those are only kept when they are
+# numbers
+def fen_lines(lines):
+
+    for line in lines:
+        fields = line.split(";")[0].split()
+        if not fields or fields[0].startswith("#"):
+            continue
+        if not all(field.isdigit() for field in fields[4:6]):
+            fields = fields[:4]
+        yield " ".join(fields[:6])
+
+
+# name of a (row, col) square like e4
+def square_name(square):
+    return COLUMNS[square[1]] + str(8 - square[0])
+
+
+# least recently used cache of (legal moves, checkmate, stalemate) by position key, the key changes with every move
+# made or taken back so an entry can't go stale, it counts hits and misses to help choose a size
+class MoveCache:
+    def __init__(self, size=4096):
+        self.size = size
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key, entry):
+
+        self.entries[key] = entry
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def hit_rate(self):
+        return self.hits / max(1, self.hits + self.misses)
+
+    def stats(self):
+        return {"size": self.size, "entries": len(self.entries), "hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hit_rate()}
+
+    # a copied game (like the one a background search works on) gets an empty cache of the same size
+    def __deepcopy__(self, memo):
+        return MoveCache(self.size)
+
 
 # keeps track of what castles are still allowed
 class Castles:
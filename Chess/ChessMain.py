@@ -3,14 +3,24 @@ James Verschleiser
 This is the driver file for my  chess game.
 """
 
+import os
+import time
+
 import pygame as p
 from Chess import ChessEngine
 from Chess import ChessAI
+from Chess import ChessBook
+from Chess import ChessTablebase
 
 WIDTH = HEIGHT = 512
 DIMENSION = 8
 SQ_SIZE = HEIGHT // DIMENSION
 MAX_FPS = 15
+AI_TIME = 1000      # milliseconds the computer gets to think about each move
+PONDER = True       # in single player the computer keeps thinking about the reply it expects while the player thinks
+BOOK = "book.bin"   # opening book the computer plays from if there is one (see ChessBook)
+TABLEBASES = "tablebases"   # directory of endgame tables the computer uses if there is one (see ChessTablebase)
+MOVE_CACHE = 256    # positions whose legal moves are kept, so going back and forth doesn't generate them again
 IMAGES = {}
 
 menu = True
@@ -18,11 +28,13 @@ multiplayer = False
 single = False
 
 
-# load in the chess piece images
+# load in the chess piece images, scaled to the squares and converted to the screen's format once so drawing them is
+# only a copy (needs the display to be set up first)
 def load_images():
     pieces = ["bR", "bN", "bB", "bQ", "bK", "bP", "wR", "wN", "wB", "wQ", "wK", "wP"]
     for piece in pieces:
-        IMAGES[piece] = p.image.load("images/" + piece + ".png")
+        image = p.image.load("images/" + piece + ".png")
+        IMAGES[piece] = p.transform.smoothscale(image, (SQ_SIZE, SQ_SIZE)).convert_alpha()
 
 
 # the function that actually runs the game
@@ -33,14 +45,24 @@ def main():
     p.init()
     screen = p.display.set_mode((WIDTH, HEIGHT))
     clock = p.time.Clock()
-    screen.fill(p.Color("white"))
 
     g = ChessEngine.Game()      # create the game
-    AI = ChessAI.AI(g)          # start the AI
+    g.move_cache = ChessEngine.MoveCache(MOVE_CACHE)
+    # start the AI
+    AI = ChessAI.AI(g, book=ChessBook.Book(BOOK) if os.path.exists(BOOK) else None,
+                    tablebase=ChessTablebase.Tablebase(TABLEBASES) if os.path.isdir(TABLEBASES) else None)
     valid_moves = g.all_moves()         # generate all the initial moves that can be made
     find_moves = False
+    search = None       # the computer's move being searched for in the background
+    deadline = None     # perf_counter time a search carried on from pondering has to stop by
+    ponder = None       # search of the position after the player's expected reply, running while the player thinks
+    ponder_move = None  # the reply it expects
+    ponder_start = 0    # when it started
+    searcher = None     # the AI copy that found the computer's last move, its principal variation has the reply
 
     load_images()
+    renderer = Renderer(screen)
+    p.display.update(renderer.show_menu())
 
     running = True
     curr_sq = ()
@@ -48,10 +70,21 @@ def main():
 
     while running:
 
-        for e in p.event.get():
+        # with nothing to do until the player does something the loop sleeps until there is an event instead of
+        # polling, so the computer gets the processor to itself between moves
+        if search is None and not find_moves:
+            events = [p.event.wait()] + p.event.get()
+        else:
+            events = p.event.get()
+
+        for e in events:
 
             # allows the user to quit the program
             if e.type == p.QUIT:
+                if search is not None:
+                    search.cancel()
+                if ponder is not None:
+                    ponder.cancel()
                 running = False
 
             # if the event is the user clicking the mouse
@@ -72,6 +105,9 @@ def main():
                             multiplayer = True
                     continue    # make sure you don't move pieces while on menu screen
 
+                if search is not None:
+                    continue    # the player can't move while the computer is thinking
+
                 # finding the square coordinates of the mouseclick
                 col = location[0]//SQ_SIZE
                 row = location[1]//SQ_SIZE
@@ -92,11 +128,12 @@ def main():
 
                         for i in range(len(valid_moves)):
                             # if the move stored is valid given the rules of chess
-                            if valid_moves[i].print_move() == move.print_move():
-                                g.make_move(valid_moves[i])     # make the move
+                            if valid_moves[i] == move:
+                                g.make_move(valid_moves[i])     # make the move (the first promotion is the queen)
                                 find_moves = True    # tell the computer to begin calculating the opponent's valid moves
                                 curr_sq = ()
                                 clicks = []
+                                break
 
                         if curr_sq != ():
                             clicks = [curr_sq]
@@ -108,106 +145,196 @@ def main():
                         for i in range(len(valid_moves)):
                             # if the move stored is valid given the rules of chess
                             if move is not None:
-                                if valid_moves[i].print_move() == move.print_move():
+                                if valid_moves[i] == move:
                                     g.make_move(valid_moves[i])  # make the move
                                     find_moves = True  # tell the computer to begin calculating the player's valid moves
 
-                                    move = AI.find_move(2, True)       # finds the best move
-                                    if move is not None:       # makes sure there is a move (not checkmate or stalemate)
-                                        g.make_move(move)
+                                    # if the player made the expected move the pondering search already has the
+                                    # position and carries on, its time counts from when it started so a player
+                                    # who took longer than that gets the answer right away
+                                    if ponder is not None and valid_moves[i] == ponder_move:
+                                        search = ponder
+                                        deadline = max(time.perf_counter(), ponder_start + AI_TIME / 1000)
+
+                                    # otherwise the computer looks for its move in the background from scratch
+                                    # (keeping what the transposition table learned) so the window keeps running
+                                    else:
+                                        if ponder is not None:
+                                            ponder.cancel()
+                                        search = ChessAI.BackgroundSearch(AI, AI_TIME, True)
+                                    ponder = None
 
                                     curr_sq = ()
                                     clicks = []
+                                    break
 
                         # adds the selected square to clicks
                         if curr_sq != ():
                             clicks = [curr_sq]
 
-                # if the game is over go back to menu and reset the game
-                if g.checkmate or g.stalemate:
-                    menu = True
-                    single = False
-                    multiplayer = False
-                    g = ChessEngine.Game()
-                    AI = ChessAI.AI(g)
-                    find_moves = True
+            # the window was uncovered, the screen surface still holds everything so it only needs showing again
+            elif e.type == p.VIDEOEXPOSE:
+                p.display.flip()
 
             elif e.type == p.KEYDOWN:
 
                 # if the user clicks u then we want to undo the last made move
                 if e.key == p.K_u:
+                    if search is not None:      # stop the computer thinking and take back the player's move
+                        search.cancel()
+                        search = None
+                        deadline = None
+                    if ponder is not None:
+                        ponder.cancel()
+                        ponder = None
                     g.undo_move()
                     find_moves = True
 
+        # a search carried on from pondering has no time limit of its own
+        if search is not None and deadline is not None and time.perf_counter() >= deadline:
+            search.stop()
+            deadline = None
+
+        # once the computer has found its move play it
+        played = False
+        if search is not None and search.done():
+            move = search.result(g.all_moves())
+            searcher = search.searcher
+            search = None
+            deadline = None
+            if move is not None:       # makes sure there is a move (not checkmate or stalemate)
+                g.make_move(move)
+                played = True
+            find_moves = True
+
         if find_moves:      # this calculates all the possible next moves
 
             valid_moves = g.all_moves()
             find_moves = False
 
-        # if a game is ongoing then draw the board
+            # if the game is over go back to menu and reset the game
+            if g.checkmate or g.stalemate or g.is_draw():
+                menu = True
+                single = False
+                multiplayer = False
+                if search is not None:
+                    search.cancel()
+                    search = None
+                    deadline = None
+                g = ChessEngine.Game()
+                g.move_cache = ChessEngine.MoveCache(MOVE_CACHE)
+                AI = ChessAI.AI(g, book=AI.book, tablebase=AI.tablebase)
+                valid_moves = g.all_moves()
+                played = False
+
+        # while the player thinks the computer searches the position after the reply it expects, the search copies
+        # the game when it starts so the move is only on the real board for a moment
+        if played and PONDER:
+            ponder_move = expected_reply(searcher, g)
+            if ponder_move is not None:
+                g.make_move(ponder_move)
+                ponder = ChessAI.BackgroundSearch(AI, None, True)
+                g.undo_move()
+                ponder_start = time.perf_counter()
+
+        # draw whichever screen is up, only the parts that changed are sent to the display
         if single or multiplayer:
-            draw_board(screen, g)
-
-        # draw the menu
-        if menu:
-            draw_menu(screen)
+            changed = renderer.show_board(g.board, curr_sq)
+        else:
+            changed = renderer.show_menu()
+        if changed:
+            p.display.update(changed)
 
         clock.tick(MAX_FPS)
-        p.display.flip()
 
 
-# function that draws the menu screen
-def draw_menu(screen):
-    # create the font for the title
-    title_font = p.font.SysFont('Corbel', 50)
-    title = title_font.render('Welcome to my Chess Game', True, p.Color("gray"))
+# the player's reply the computer expects after its move, the second move of the principal variation of the search
+# that found it or else the best move stored for the position, None if it has no idea
+def expected_reply(searcher, game):
 
-    # create the font for the buttons
-    button_font = p.font.SysFont('Corbel', 42)
-    button1 = button_font.render('Single Player', True, p.Color("white"))
-    button2 = button_font.render('Multiplayer', True, p.Color("white"))
+    if len(searcher.pv) > 1:
+        number = searcher.pv[1].id
+    else:
+        entry = searcher.tt.probe(game.key)
+        number = entry[3] if entry is not None else 0
 
-    # draw the title
-    screen.fill(p.Color("white"))
-    screen.blit(title, (WIDTH // 20, HEIGHT // 4))
+    for move in game.all_moves():
+        if move.id == number:
+            return move
+    return None
 
-    # draw the buttons
-    p.draw.rect(screen, p.Color("gray"), p.Rect(WIDTH // 4, 2 * (HEIGHT // 4), SQ_SIZE * 4, SQ_SIZE))
-    screen.blit(button1, (WIDTH // 4, 2 * (HEIGHT // 4)))
-    p.draw.rect(screen, p.Color("gray"), p.Rect(WIDTH // 4, 3 * (HEIGHT // 4), SQ_SIZE * 4, SQ_SIZE))
-    screen.blit(button2, (WIDTH // 4, 3 * (HEIGHT // 4)))
 
+# draws the menu and board from surfaces made once at the start, and remembers what is on the screen so only the
+# squares that changed since the last frame get drawn again
+class Renderer:
 
-# draws the board by adding the squares and pieces
-def draw_board(screen, g):
+    def __init__(self, screen):
+        self.screen = screen
 
-    white = p.Color("white")
-    gray = p.Color("gray")
+        # the empty board in the famous checkerboard pattern
+        self.background = p.Surface((WIDTH, HEIGHT)).convert()
+        for row in range(DIMENSION):
+            for col in range(DIMENSION):
+                color = p.Color("white") if (row + col) % 2 == 0 else p.Color("gray")
+                p.draw.rect(self.background, color, p.Rect(col * SQ_SIZE, row * SQ_SIZE, SQ_SIZE, SQ_SIZE))
 
-    # draws the squares in the famous checkerboard pattern
-    for row in range(DIMENSION):
-        for col in range(DIMENSION):
+        # shading put over the selected square
+        self.highlight = p.Surface((SQ_SIZE, SQ_SIZE), p.SRCALPHA)
+        self.highlight.fill((255, 215, 0, 110))
 
-            if row % 2 == 0:
-                if col % 2 == 0:
-                    p.draw.rect(screen, white, p.Rect(col*SQ_SIZE, row*SQ_SIZE, SQ_SIZE, SQ_SIZE))
-                else:
-                    p.draw.rect(screen, gray, p.Rect(col * SQ_SIZE, row * SQ_SIZE, SQ_SIZE, SQ_SIZE))
+        # the whole menu screen with its title and buttons
+        title_font = p.font.SysFont('Corbel', 50)
+        button_font = p.font.SysFont('Corbel', 42)
+        self.menu = p.Surface((WIDTH, HEIGHT)).convert()
+        self.menu.fill(p.Color("white"))
+        self.menu.blit(title_font.render('Welcome to my Chess Game', True, p.Color("gray")), (WIDTH // 20, HEIGHT // 4))
+        p.draw.rect(self.menu, p.Color("gray"), p.Rect(WIDTH // 4, 2 * (HEIGHT // 4), SQ_SIZE * 4, SQ_SIZE))
+        self.menu.blit(button_font.render('Single Player', True, p.Color("white")), (WIDTH // 4, 2 * (HEIGHT // 4)))
+        p.draw.rect(self.menu, p.Color("gray"), p.Rect(WIDTH // 4, 3 * (HEIGHT // 4), SQ_SIZE * 4, SQ_SIZE))
+        self.menu.blit(button_font.render('Multiplayer', True, p.Color("white")), (WIDTH // 4, 3 * (HEIGHT // 4)))
 
-            else:
-                if col % 2 == 0:
-                    p.draw.rect(screen, gray, p.Rect(col*SQ_SIZE, row*SQ_SIZE, SQ_SIZE, SQ_SIZE))
-                else:
-                    p.draw.rect(screen, white, p.Rect(col * SQ_SIZE, row * SQ_SIZE, SQ_SIZE, SQ_SIZE))
+        self.shown = None       # (piece, selected) on each square of the board on the screen, None for the menu
+        self.menu_shown = False
+
+    # puts the menu up if it isn't already, returns the area of the screen that changed
+    def show_menu(self):
+
+        if self.menu_shown:
+            return []
+
+        self.screen.blit(self.menu, (0, 0))
+        self.menu_shown = True
+        self.shown = None
+        return [self.screen.get_rect()]
+
+    # brings the board on the screen up to date with the game, redrawing only the squares whose piece or selection
+    # changed (a move touches two to four squares), returns the areas of the screen that changed
+    def show_board(self, board, selected):
+
+        if self.shown is None:
+            self.shown = [[None] * DIMENSION for _ in range(DIMENSION)]
+            self.menu_shown = False
+
+        changed = []
+        for row in range(DIMENSION):
+            for col in range(DIMENSION):
+
+                square = (board[row][col], selected == (row, col))
+                if self.shown[row][col] == square:
+                    continue
 
-    # responsible for adding the pieces to the correct squares
-    for row in range(DIMENSION):
-        for col in range(DIMENSION):
+                rect = p.Rect(col * SQ_SIZE, row * SQ_SIZE, SQ_SIZE, SQ_SIZE)
+                self.screen.blit(self.background, rect, rect)
+                if square[1]:
+                    self.screen.blit(self.highlight, rect)
+                if square[0] != "--":    # if the square is supposed to have a piece on it
+                    self.screen.blit(IMAGES[square[0]], rect)
 
-            square = g.board[row][col]
+                self.shown[row][col] = square
+                changed.append(rect)
 
-            if square != "--":    # if the square is supposed to have a piece on it
-                screen.blit(IMAGES[square], p.Rect(col * SQ_SIZE, row * SQ_SIZE, SQ_SIZE, SQ_SIZE))
+        return changed
 
 
-main()
+if __name__ == "__main__":
+    main()
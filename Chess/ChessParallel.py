@@ -0,0 +1,164 @@
+"""
+James Verschleiser
+Searches the root moves on several cores at once, every worker process keeps its own game, AI and transposition table
+
+usage: python -m Chess.ChessParallel [--position NAME | --fen FEN] [--depth N] [--workers N]
+"""
+
+import argparse
+import multiprocessing
+import sys
+import time
+
+from Chess import ChessAI
+from Chess import ChessEngine
+from Chess import ChessPerft
+from Chess import ChessWorker
+
+# set up in each worker process along with ChessWorker's game and AI
+worker_bound = None         # best root score found so far by any worker, shared by all of them
+worker_snapshot = None      # position the worker's game is at, so it is only loaded when it changes
+
+
+# runs once in every worker process after ChessWorker.init
+def init_worker(bound):
+
+    global worker_bound, worker_snapshot
+    worker_bound = bound
+    worker_snapshot = None
+
+
+# searches one root move in a worker, the shared bound is read before starting so moves that can't beat the best one
+# found so far are cut off early (full searches it with the whole window instead), returns the move's id, its score,
+# the nodes searched and whether the score is exact, a move that failed low only gets a limit the score is under
+def search_move(snapshot, number, depth, maximize, full=False):
+
+    global worker_snapshot
+    if snapshot != worker_snapshot:
+        ChessWorker.game.load_snapshot(snapshot)
+        worker_snapshot = snapshot
+
+    move = ChessEngine.decode_move(number, ChessWorker.game.board)
+
+    # the shared bound is positive when good for black like the AI's scores, the search's are for the side to move
+    if full:
+        alpha = -ChessAI.INFINITE
+    else:
+        alpha = worker_bound.value if maximize else -worker_bound.value
+
+    ChessWorker.ai.nodes = 0
+    ChessWorker.game.make_move(move)
+    score = -ChessWorker.ai.search(depth - 1, -ChessAI.INFINITE, -alpha, 1)
+    ChessWorker.game.undo_move()
+    exact = score > alpha
+    if not maximize:
+        score = -score
+
+    # only an exact score is sure to be reached, a failed low one could raise the bound above the real best
+    if exact:
+        with worker_bound.get_lock():
+            if (maximize and score > worker_bound.value) or (not maximize and score < worker_bound.value):
+                worker_bound.value = score
+
+    return number, score, ChessWorker.ai.nodes, exact
+
+
+class ParallelSearch:
+
+    def __init__(self, workers=None, tt_size=16):
+
+        self.workers = ChessWorker.count(workers)
+        self.bound = multiprocessing.Value("i", 0)
+        self.pool = ChessWorker.pool(self.workers, tt_size, init_worker, self.bound)
+        self.nodes = 0      # nodes searched by all the workers during the last search
+
+    # same as AI.find_move but with the root moves shared out between the workers
+    def find_move(self, game, depth, maximize):
+
+        moves = game.all_moves()
+
+        if len(moves) == 0:
+            game.checkmate = True
+            return None
+
+        # the moves most likely to be best go first so the bound they set cuts off the rest
+        moves = ChessAI.AI(game, 0).order_moves(moves, 0)
+        snapshot = game.snapshot()
+        self.bound.value = -ChessAI.INFINITE if maximize else ChessAI.INFINITE
+        self.nodes = 0
+
+        # the first move is searched alone so every other move starts with a useful bound
+        results = [self.pool.submit(search_move, snapshot, moves[0].id, depth, maximize).result()]
+        futures = [self.pool.submit(search_move, snapshot, move.id, depth, maximize) for move in moves[1:]]
+        results += [future.result() for future in futures]
+
+        # results are in move order so ties go to the earlier move like in the single core search, a move that failed
+        # low is searched again with the whole window if its limit doesn't rule out it being the best
+        best_move = -ChessAI.INFINITE if maximize else ChessAI.INFINITE
+        final_move = None
+        for move, (_, score, nodes, exact) in zip(moves, results):
+            self.nodes += nodes
+            if not exact and (final_move is None or (maximize and score >= best_move) or
+                              (not maximize and score <= best_move)):
+                _, score, nodes, exact = self.pool.submit(search_move, snapshot, move.id, depth, maximize,
+                                                          True).result()
+                self.nodes += nodes
+            if (maximize and score > best_move) or (not maximize and score < best_move) or final_move is None:
+                best_move = score
+                final_move = move
+
+        return final_move
+
+    def close(self):
+        self.pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# times the single core search against the parallel one at the same depth and prints the speedup
+def benchmark(fen, depth, workers=None, out=sys.stdout):
+
+    game = ChessPerft.new_game(fen)
+    maximize = game.turn == "b"
+
+    ai = ChessAI.AI(game)
+    start = time.perf_counter()
+    single_move = ai.find_move(depth, maximize)
+    single_time = time.perf_counter() - start
+    print("1 core:      {} in {:.3f}s, {} nodes".format(single_move.get_notation(), single_time, ai.nodes), file=out)
+
+    with ParallelSearch(workers) as search:
+        search.find_move(game, 1, maximize)         # starts the worker processes so they aren't part of the time
+
+        start = time.perf_counter()
+        parallel_move = search.find_move(game, depth, maximize)
+        parallel_time = time.perf_counter() - start
+        print("{} workers: {} in {:.3f}s, {} nodes".format(search.workers, parallel_move.get_notation(), parallel_time,
+                                                          search.nodes), file=out)
+
+    print("speedup: {:.2f}x".format(single_time / max(parallel_time, 1e-9)), file=out)
+
+    return single_time, parallel_time
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="compare the single core and parallel searches")
+    parser.add_argument("--position", default="start", choices=sorted(ChessPerft.POSITIONS),
+                        help="standard position to use")
+    parser.add_argument("--fen", help="position to use instead of a standard one")
+    parser.add_argument("--depth", type=int, default=4)
+    parser.add_argument("--workers", type=int, help="worker processes (defaults to one per core)")
+    args = parser.parse_args(argv)
+
+    fen = args.fen if args.fen else ChessPerft.POSITIONS[args.position][0]
+    benchmark(fen, args.depth, args.workers)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
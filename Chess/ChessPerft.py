@@ -0,0 +1,135 @@
+"""
+James Verschleiser
+Perft counts every move sequence to a given depth so move generation can be checked against known numbers and timed
+
+usage: python -m Chess.ChessPerft [--position NAME | --fen FEN] [--depth N] [--divide] [--check] [--cache N]
+"""
+
+import argparse
+import sys
+import time
+
+from Chess import ChessEngine
+
+# standard test positions and their known node counts for depth 1, 2, 3, ...
+POSITIONS = {
+    "start": (ChessEngine.START_FEN,
+              [20, 400, 8902, 197281, 4865609, 119060324]),
+    "kiwipete": ("r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+                 [48, 2039, 97862, 4085603, 193690690]),
+    "endgame": ("8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+                [14, 191, 2812, 43238, 674624, 11030083]),
+    "promotions": ("r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+                   [6, 264, 9467, 422333, 15833292]),
+    "talkchess": ("rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+                  [44, 1486, 62379, 2103487, 89941194]),
+    "middlegame": ("r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+                   [46, 2079, 89890, 3894594, 164075551]),
+}
+
+
+# creates a game set up at the given position, with a move cache of cache entries if asked for
+def new_game(fen, cache=None):
+
+    game = ChessEngine.Game()
+    game.load_fen(fen)
+    if cache:
+        game.move_cache = ChessEngine.MoveCache(cache)
+    return game
+
+
+# counts the leaf nodes of the move tree to the given depth
+def perft(game, depth):
+
+    if depth == 0:
+        return 1
+
+    moves = game.all_moves()
+    if depth == 1:      # no need to make the last moves just to count them
+        return len(moves)
+
+    nodes = 0
+    for move in moves:
+        game.make_move(move)
+        nodes += perft(game, depth - 1)
+        game.undo_move()
+
+    return nodes
+
+
+# perft split up by the first move, returns a list of (move notation, nodes) pairs
+def divide(game, depth):
+
+    results = []
+    for move in game.all_moves():
+        game.make_move(move)
+        results.append((move.get_notation(), perft(game, depth - 1)))
+        game.undo_move()
+
+    return results
+
+
+# runs perft on one position, printing the node count and speed (and the divide if asked for)
+def run(fen, depth, show_divide=False, cache=None, out=sys.stdout):
+
+    game = new_game(fen, cache)
+    start = time.perf_counter()
+
+    if show_divide:
+        results = divide(game, depth)
+        nodes = sum(count for _, count in results)
+        for notation, count in sorted(results):
+            print(notation + ": " + str(count), file=out)
+    else:
+        nodes = perft(game, depth)
+
+    seconds = time.perf_counter() - start
+    print("depth {}: {} nodes in {:.3f}s ({:.0f} nodes/sec)".format(depth, nodes, seconds, nodes / max(seconds, 1e-9)),
+          file=out)
+    if game.move_cache is not None:
+        print("move cache: {hits} hits, {misses} misses ({hit_rate:.1%}), {entries} entries".format(
+            **game.move_cache.stats()), file=out)
+
+    return nodes, seconds
+
+
+# runs every standard position up to max_depth and compares the counts with the known ones
+def check(max_depth, cache=None, out=sys.stdout):
+
+    passed = True
+    for name, (fen, expected) in POSITIONS.items():
+        for depth in range(1, min(max_depth, len(expected)) + 1):
+            game = new_game(fen, cache)
+            start = time.perf_counter()
+            nodes = perft(game, depth)
+            seconds = time.perf_counter() - start
+
+            result = "ok" if nodes == expected[depth - 1] else "FAILED (expected {})".format(expected[depth - 1])
+            passed = passed and nodes == expected[depth - 1]
+            print("{:<11} depth {}: {:>10} nodes {:>9.0f} nodes/sec  {}".format(
+                name, depth, nodes, nodes / max(seconds, 1e-9), result), file=out)
+
+    return passed
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="count and time move generation")
+    parser.add_argument("--position", default="start", choices=sorted(POSITIONS), help="standard position to use")
+    parser.add_argument("--fen", help="position to use instead of a standard one")
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--divide", action="store_true", help="print the node count under every first move")
+    parser.add_argument("--check", action="store_true", help="check every standard position up to --depth")
+    parser.add_argument("--cache", type=int, help="cache the legal moves of this many positions")
+    args = parser.parse_args(argv)
+
+    if args.check:
+        return 0 if check(args.depth, args.cache) else 1
+
+    fen = args.fen if args.fen else POSITIONS[args.position][0]
+    run(fen, args.depth, args.divide, args.cache)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
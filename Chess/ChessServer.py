@@ -0,0 +1,289 @@
+"""
+James Verschleiser
+Asyncio server that hosts many games against the computer at once over a simple line protocol, the searches are sent
+to a pool of worker processes, plus a load generator that plays random games against it and measures the speed
+
+usage: python -m Chess.ChessServer serve [--port N] [--workers N] [--time MS] [--max-games N]
+       python -m Chess.ChessServer load [--port N] [--clients N] [--games N] [--plies N] [--time MS]
+
+protocol, one command per line with one answer line (two when the computer's move ends the game):
+    new [time MS] [fen FEN]     ->  game ID                 start a game, the player has the side to move
+    move ID MOVE                ->  move ID MOVE            play a move and get the computer's answer
+    go ID                       ->  move ID MOVE            have the computer move (to let it take the first move)
+    fen ID                      ->  fen ID FEN
+    close ID                    ->  closed ID
+    a finished game answers     ->  over ID RESULT          RESULT is 1-0, 0-1 or 1/2-1/2
+    anything wrong answers      ->  error MESSAGE
+"""
+
+import argparse
+import asyncio
+import random
+import sys
+import time
+
+from Chess import ChessAI
+from Chess import ChessEngine
+from Chess import ChessWorker
+
+PORT = 8765
+MOVE_TIME = 100         # milliseconds the computer thinks per move unless the game asks for something else
+MAX_TIME = 10000        # the most a game can ask for
+MAX_GAMES = 10000       # games kept in memory at once
+QUEUED = 2              # searches waiting per worker before new requests have to wait their turn
+
+# searches a position in a worker and returns the id of the move found
+def think(snapshot, time_limit):
+
+    ChessWorker.game.load_snapshot(snapshot)
+    move = ChessWorker.ai.timed_find_move(time_limit, ChessWorker.game.turn == "b")
+    return None if move is None else move.id
+
+
+# the result of a game that is over, None if it is still going
+def result(game):
+
+    game.all_moves()
+    if game.checkmate:
+        return "0-1" if game.turn == "w" else "1-0"
+    if game.stalemate or game.is_draw():
+        return "1/2-1/2"
+    return None
+
+
+class GameServer:
+
+    def __init__(self, workers=None, move_time=MOVE_TIME, max_games=MAX_GAMES, tt_size=16):
+
+        self.workers = ChessWorker.count(workers)
+        self.move_time = move_time
+        self.max_games = max_games
+        self.tt_size = tt_size
+
+        self.games = {}         # every game being played, by id
+        self.times = {}         # milliseconds per move of each game
+        self.next_id = 1
+        self.pool = None
+        self.slots = None       # limits the searches handed to the pool so its queue can't grow without end
+        self.moves = 0          # computer moves played since the server started
+
+    async def serve(self, host="127.0.0.1", port=PORT):
+
+        self.pool = ChessWorker.pool(self.workers, self.tt_size)
+        self.slots = asyncio.Semaphore(self.workers * QUEUED)
+        server = await asyncio.start_server(self.connection, host, port)
+        print("serving on {}:{} with {} workers".format(host, port, self.workers), file=sys.stderr)
+
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.pool.shutdown()
+
+    # talks to one client, the games it started are thrown away when it disconnects
+    async def connection(self, reader, writer):
+
+        owned = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                for answer in await self.command(line.decode().split(), owned):
+                    writer.write((answer + "\n").encode())
+                await writer.drain()        # a client that doesn't read its answers stops being served
+        except ConnectionError:
+            pass
+        finally:
+            for game_id in owned:
+                self.games.pop(game_id, None)
+                self.times.pop(game_id, None)
+            writer.close()
+
+    # carries out one command and gives back the lines to answer with
+    async def command(self, words, owned):
+
+        if not words:
+            return []
+        name, args = words[0], words[1:]
+
+        if name == "new":
+            return [self.new_game(args, owned)]
+
+        if len(args) == 0 or not args[0].isdigit() or int(args[0]) not in owned:
+            return ["error no such game"]
+        game_id = int(args[0])
+        game = self.games[game_id]
+
+        if name == "fen":
+            return ["fen {} {}".format(game_id, game.get_fen())]
+
+        if name == "close":
+            owned.discard(game_id)
+            del self.games[game_id]
+            del self.times[game_id]
+            return ["closed {}".format(game_id)]
+
+        if name == "move":
+            if len(args) < 2:
+                return ["error move needs a move"]
+            if result(game) is not None:
+                return ["over {} {}".format(game_id, result(game))]
+            try:
+                game.make_move(game.parse_move(args[1]))
+            except ValueError as error:
+                return ["error " + str(error)]
+            if result(game) is not None:
+                return ["over {} {}".format(game_id, result(game))]
+            return await self.reply(game_id, game)
+
+        if name == "go":
+            if result(game) is not None:
+                return ["over {} {}".format(game_id, result(game))]
+            return await self.reply(game_id, game)
+
+        return ["error unknown command " + name]
+
+    # new [time MS] [fen FEN]
+    def new_game(self, args, owned):
+
+        if len(self.games) >= self.max_games:
+            return "error too many games"
+
+        game = ChessEngine.Game()
+        move_time = self.move_time
+        try:
+            if "time" in args:
+                move_time = min(max(1, int(args[args.index("time") + 1])), MAX_TIME)
+            if "fen" in args:
+                game.load_fen(" ".join(args[args.index("fen") + 1:]))
+        except (ValueError, IndexError) as error:
+            return "error bad new game: " + str(error)
+
+        game_id = self.next_id
+        self.next_id += 1
+        self.games[game_id] = game
+        self.times[game_id] = move_time
+        owned.add(game_id)
+        return "game {}".format(game_id)
+
+    # gets the computer's move from the pool, waiting for a free slot first when the pool is busy
+    async def reply(self, game_id, game):
+
+        async with self.slots:
+            loop = asyncio.get_running_loop()
+            number = await loop.run_in_executor(self.pool, think, game.snapshot(), self.times[game_id])
+
+        if game_id not in self.games:       # closed while the computer was thinking
+            return []
+
+        move = ChessEngine.decode_move(number, game.board)
+        game.make_move(move)
+        self.moves += 1
+
+        answers = ["move {} {}".format(game_id, move.get_notation())]
+        if result(game) is not None:
+            answers.append("over {} {}".format(game_id, result(game)))
+        return answers
+
+
+# plays random moves against the server in one connection, recording how long each answer took
+async def play(host, port, games, plies, move_time, latencies, finished, rng):
+
+    reader, writer = await asyncio.open_connection(host, port)
+
+    async def ask(line):
+        writer.write((line + "\n").encode())
+        await writer.drain()
+        return (await reader.readline()).decode().split()
+
+    for _ in range(games):
+        game = ChessEngine.Game()
+        game_id = (await ask("new time {}".format(move_time)))[1]
+
+        for _ in range(plies):
+            moves = game.all_moves()
+            if not moves:
+                break
+            move = rng.choice(moves)
+            game.make_move(move)
+
+            start = time.perf_counter()
+            answer = await ask("move {} {}".format(game_id, move.get_notation()))
+            latencies.append(time.perf_counter() - start)
+
+            if answer[0] != "move":
+                break
+            game.make_move(game.parse_move(answer[2]))
+            if result(game) is not None:
+                await reader.readline()     # the game over line that follows the move
+                break
+
+        await ask("close {}".format(game_id))
+        finished.append(time.perf_counter())
+
+    writer.close()
+
+
+# runs clients at once against a server and prints games per second and percentiles of the time to get a move
+def load(host="127.0.0.1", port=PORT, clients=8, games=4, plies=40, move_time=20, seed=2020, out=sys.stdout):
+
+    latencies = []
+    finished = []
+    rng = random.Random(seed)
+
+    async def run():
+        await asyncio.gather(*[play(host, port, games, plies, move_time, latencies, finished,
+                                    random.Random(rng.random())) for _ in range(clients)])
+
+    start = time.perf_counter()
+    asyncio.run(run())
+    seconds = time.perf_counter() - start
+
+    latencies.sort()
+    print("{} games, {} moves in {:.1f}s: {:.2f} games/sec, {:.1f} moves/sec".format(
+        len(finished), len(latencies), seconds, len(finished) / seconds, len(latencies) / seconds), file=out)
+    if latencies:
+        print("move latency ms: p50 {:.0f}  p90 {:.0f}  p99 {:.0f}  max {:.0f}".format(
+            *[1000 * latencies[min(len(latencies) - 1, int(len(latencies) * q))] for q in (0.5, 0.9, 0.99)],
+            1000 * latencies[-1]), file=out)
+
+    return len(finished) / seconds, latencies
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="serve games against the computer or put a server under load")
+    commands = parser.add_subparsers(dest="command")
+
+    serve_parser = commands.add_parser("serve", help="run the game server")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=PORT)
+    serve_parser.add_argument("--workers", type=int, help="worker processes (defaults to one per core)")
+    serve_parser.add_argument("--time", type=int, default=MOVE_TIME, help="milliseconds per move unless asked")
+    serve_parser.add_argument("--max-games", type=int, default=MAX_GAMES)
+
+    load_parser = commands.add_parser("load", help="play random games against a running server")
+    load_parser.add_argument("--host", default="127.0.0.1")
+    load_parser.add_argument("--port", type=int, default=PORT)
+    load_parser.add_argument("--clients", type=int, default=8, help="connections playing at the same time")
+    load_parser.add_argument("--games", type=int, default=4, help="games each connection plays")
+    load_parser.add_argument("--plies", type=int, default=40, help="most moves the client makes in a game")
+    load_parser.add_argument("--time", type=int, default=20, help="milliseconds per move to ask for")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        server = GameServer(args.workers, args.time, args.max_games)
+        asyncio.run(server.serve(args.host, args.port))
+    elif args.command == "load":
+        load(args.host, args.port, args.clients, args.games, args.plies, args.time)
+    else:
+        parser.print_help()
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
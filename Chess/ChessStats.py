@@ -0,0 +1,270 @@
+"""
+James Verschleiser
+Counts what a search does (nodes, evaluations and cutoffs at every ply, how many moves positions have and how often
+the first move causes the cutoff) and times the parts of the search it spends its time in, optionally under cProfile
+
+The AI only counts when it is given a SearchStats, so a search without one pays a single check per node. The times
+are measured by wrapping the game's and AI's methods for the length of one search, the time of a method doesn't
+include the time of the wrapped methods it calls
+
+usage: python -m Chess.ChessStats [--fen FEN] [--depth N | --time MS] [--profile [FILE]] [--json]
+"""
+
+import argparse
+import cProfile
+import json
+import pstats
+import sys
+import time
+
+from Chess import ChessAI
+from Chess import ChessEngine
+
+# the parts of a search that are timed and the methods (of the game or the AI) that belong to each one
+PHASES = (
+    ("generate", "game", ("valid_moves",)),                     # moves based only on where the pieces can go
+    ("legality", "game", ("all_moves", "generate_moves", "capture_moves")),     # pins, checks, illegal moves
+    ("make", "game", ("make_move",)),
+    ("undo", "game", ("undo_move",)),
+    ("evaluate", "ai", ("score",)),
+    ("ordering", "ai", ("order_moves",)),
+)
+
+
+class SearchStats:
+
+    def __init__(self):
+
+        # counts by ply, the root is ply 0 (the lists grow as deeper plies are reached)
+        self.nodes = []         # positions searched, quiescence included
+        self.leaves = []        # positions given a static evaluation
+        self.cutoffs = []       # moves that failed high and cut off the rest
+        self.first_cutoffs = []     # cutoffs caused by the first move tried
+        self.tt_cutoffs = []    # positions answered by the transposition table without searching
+        self.expanded = []      # positions whose moves were generated and searched
+        self.moves = []         # moves those positions had
+
+        self.iterations = []    # (depth, nodes, seconds since the search started) of every completed iteration
+        self.times = {}         # seconds spent in each phase
+        self.calls = {}         # times each phase was entered
+        self.seconds = 0        # length of the whole search
+        self.profile = None     # pstats.Stats of the search when it was profiled
+
+        self.timing = []        # time spent in wrapped methods called by the ones still running, innermost last
+
+    def node(self, ply):
+        add(self.nodes, ply, 1)
+
+    def leaf(self, ply):
+        add(self.leaves, ply, 1)
+
+    def tt_cutoff(self, ply):
+        add(self.tt_cutoffs, ply, 1)
+
+    def expand(self, ply, count):
+
+        add(self.expanded, ply, 1)
+        add(self.moves, ply, count)
+
+    def cutoff(self, ply, first):
+
+        add(self.cutoffs, ply, 1)
+        if first:
+            add(self.first_cutoffs, ply, 1)
+
+    # nodes counted by the AI are cumulative over the iterations, each iteration keeps only its own
+    def iteration(self, depth, nodes, seconds):
+        self.iterations.append((depth, nodes - sum(entry[1] for entry in self.iterations), seconds))
+
+    # average number of moves in the positions that were searched
+    def branching_factor(self):
+        return sum(self.moves) / max(1, sum(self.expanded))
+
+    # how many times more nodes each iteration took than the one before, on average
+    def effective_branching_factor(self):
+
+        nodes = [entry[1] for entry in self.iterations if entry[1] > 0]
+        if len(nodes) < 2:
+            return None
+        return (nodes[-1] / nodes[0]) ** (1 / (len(nodes) - 1))
+
+    # fraction of cutoffs caused by the first move, the closer to 1 the better the move ordering
+    def first_cutoff_rate(self):
+        return sum(self.first_cutoffs) / max(1, sum(self.cutoffs))
+
+    # replaces the methods of the game and the AI with ones that time themselves, until detach is called
+    def attach(self, ai):
+
+        for phase, owner, names in PHASES:
+            self.times.setdefault(phase, 0.0)
+            self.calls.setdefault(phase, 0)
+            target = ai.game if owner == "game" else ai
+            for name in names:
+                if hasattr(target, name):
+                    setattr(target, name, self.timed(phase, getattr(target, name)))
+
+    # puts the original methods back
+    def detach(self, ai):
+
+        for phase, owner, names in PHASES:
+            target = ai.game if owner == "game" else ai
+            for name in names:
+                target.__dict__.pop(name, None)
+
+    # wraps a method so the time spent in it, less the time spent in other wrapped methods it calls, goes to phase
+    def timed(self, phase, method):
+
+        timing = self.timing
+        times = self.times
+        calls = self.calls
+        clock = time.perf_counter
+
+        def wrapper(*args, **kwargs):
+            timing.append(0.0)
+            start = clock()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                elapsed = clock() - start
+                times[phase] += elapsed - timing.pop()
+                calls[phase] += 1
+                if timing:
+                    timing[-1] += elapsed
+
+        return wrapper
+
+    # the counters as plain lists and numbers, ready to be written as JSON
+    def as_dict(self):
+
+        plies = len(self.nodes)
+        return {
+            "seconds": self.seconds,
+            "nodes": sum(self.nodes),
+            "leaves": sum(self.leaves),
+            "cutoffs": sum(self.cutoffs),
+            "tt_cutoffs": sum(self.tt_cutoffs),
+            "branching_factor": self.branching_factor(),
+            "effective_branching_factor": self.effective_branching_factor(),
+            "first_cutoff_rate": self.first_cutoff_rate(),
+            "iterations": [{"depth": depth, "nodes": nodes, "seconds": seconds}
+                           for depth, nodes, seconds in self.iterations],
+            "plies": [{"ply": ply, "nodes": get(self.nodes, ply), "leaves": get(self.leaves, ply),
+                       "cutoffs": get(self.cutoffs, ply), "first_cutoffs": get(self.first_cutoffs, ply),
+                       "tt_cutoffs": get(self.tt_cutoffs, ply), "expanded": get(self.expanded, ply),
+                       "moves": get(self.moves, ply)} for ply in range(plies)],
+            "phases": {phase: {"seconds": self.times[phase], "calls": self.calls[phase]} for phase in self.times},
+        }
+
+    # prints the counters as tables
+    def report(self, out=sys.stdout):
+
+        print("{} nodes, {} evaluations in {:.2f}s".format(sum(self.nodes), sum(self.leaves), self.seconds), file=out)
+        effective = self.effective_branching_factor()
+        print("branching factor {:.1f}, effective {}, first move cutoffs {:.1%}".format(
+            self.branching_factor(), "-" if effective is None else "{:.1f}".format(effective),
+            self.first_cutoff_rate()), file=out)
+
+        print("\n{:>5} {:>10} {:>10}".format("depth", "nodes", "elapsed"), file=out)
+        for depth, nodes, seconds in self.iterations:
+            print("{:>5} {:>10} {:>10.3f}".format(depth, nodes, seconds), file=out)
+
+        print("\n{:>4} {:>10} {:>10} {:>9} {:>7} {:>9} {:>7}".format(
+            "ply", "nodes", "evals", "cutoffs", "first", "tt", "moves"), file=out)
+        for ply in range(len(self.nodes)):
+            cutoffs = get(self.cutoffs, ply)
+            print("{:>4} {:>10} {:>10} {:>9} {:>7} {:>9} {:>7.1f}".format(
+                ply, get(self.nodes, ply), get(self.leaves, ply), cutoffs,
+                "-" if cutoffs == 0 else "{:.0%}".format(get(self.first_cutoffs, ply) / cutoffs),
+                get(self.tt_cutoffs, ply), get(self.moves, ply) / max(1, get(self.expanded, ply))), file=out)
+
+        if self.times:
+            other = self.seconds - sum(self.times.values())
+            print("\n{:<10} {:>9} {:>7} {:>10}".format("phase", "seconds", "share", "calls"), file=out)
+            for phase in self.times:
+                print("{:<10} {:>9.3f} {:>7.1%} {:>10}".format(
+                    phase, self.times[phase], self.times[phase] / max(self.seconds, 1e-9), self.calls[phase]),
+                    file=out)
+            print("{:<10} {:>9.3f} {:>7.1%}".format("search", other, other / max(self.seconds, 1e-9)), file=out)
+
+
+# adds to a count by ply, growing the list when the ply is new
+def add(counts, ply, amount):
+
+    while len(counts) <= ply:
+        counts.append(0)
+    counts[ply] += amount
+
+
+def get(counts, ply):
+    return counts[ply] if ply < len(counts) else 0
+
+
+# runs one search with the AI counting into a new SearchStats and returns (move, stats), it searches to depth unless a
+# time or node limit is given, timings wraps the methods to time the phases, profile runs the search under cProfile
+# and keeps the results in stats.profile (a file name also saves them there for pstats or snakeviz)
+def search(ai, maximize, depth=None, time_limit=None, node_limit=None, timings=True, profile=None):
+
+    stats = SearchStats()
+    ai.stats = stats
+    if timings:
+        stats.attach(ai)
+    profiler = cProfile.Profile() if profile else None
+
+    start = time.perf_counter()
+    try:
+        if profiler is not None:
+            profiler.enable()
+        if time_limit is None and node_limit is None:
+            move = ai.find_move(depth if depth else 4, maximize)
+        else:
+            move = ai.timed_find_move(time_limit, maximize, node_limit, depth if depth else ChessAI.MAX_DEPTH)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        stats.detach(ai)
+        ai.stats = None
+
+    stats.seconds = time.perf_counter() - start
+    if profiler is not None:
+        if isinstance(profile, str):
+            profiler.dump_stats(profile)
+        stats.profile = pstats.Stats(profiler)
+
+    return move, stats
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="show where a search spends its nodes and its time")
+    parser.add_argument("--fen", default=ChessEngine.START_FEN)
+    parser.add_argument("--depth", type=int, help="search depth (the deepest to go with --time), defaults to 4")
+    parser.add_argument("--time", type=int, help="milliseconds to search for instead of a fixed depth")
+    parser.add_argument("--no-timings", action="store_true", help="only count, without timing the phases")
+    parser.add_argument("--profile", nargs="?", const=True, help="run under cProfile, saving to a file if given")
+    parser.add_argument("--json", action="store_true", help="print the counters as JSON")
+    args = parser.parse_args(argv)
+
+    game = ChessEngine.Game()
+    game.load_fen(args.fen)
+    ai = ChessAI.AI(game)
+
+    move, stats = search(ai, game.turn == "b", args.depth, args.time, timings=not args.no_timings,
+                         profile=args.profile)
+
+    if args.json:
+        result = stats.as_dict()
+        result["move"] = None if move is None else move.get_notation()
+        print(json.dumps(result, indent=2))
+    else:
+        print("best move", "none" if move is None else move.get_notation(), "\n")
+        stats.report()
+        if stats.profile is not None:
+            print()
+            stats.profile.stream = sys.stdout
+            stats.profile.sort_stats("tottime").print_stats(20)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,557 @@
+"""
+James Verschleiser
+Endgame tablebases for positions with three or four pieces and no pawns, built by retrograde analysis (working
+backwards from every checkmate) and stored as one byte per position giving the distance to mate
+
+usage: python -m Chess.ChessTablebase build DIRECTORY [NAME...] [--four]
+       python -m Chess.ChessTablebase probe DIRECTORY [--fen FEN]
+"""
+
+import argparse
+import itertools
+import mmap
+import os
+import sys
+import time
+
+from Chess import ChessAI
+from Chess import ChessEngine
+
+# squares are numbered row * 8 + col like on the board, so a1 is 56 and h8 is 7, and a set of squares is a 64 bit
+# integer (a bitboard) with bit row * 8 + col set for each square in it
+
+# what each byte of a table means: 0 is a draw, otherwise the value minus one is the number of plies to mate with the
+# side to move winning if that is odd and getting mated if it is even, positions that can't happen are ILLEGAL
+DRAW = 0
+ILLEGAL = 255
+WIN = ChessAI.MATE      # search score of a tablebase win, less the plies to mate like a mate found by the search
+
+MAGIC = b"CHTB\x01\x00\x00\x00"        # start of every table file (the last bytes are the format version)
+EXTENSION = ".tb"
+
+KINDS = "KQRBN"     # order pieces are written in a table's name
+STRENGTH = {"K": 0, "Q": 9, "R": 5, "B": 3, "N": 3}     # the stronger side is white in a table's name
+
+THREE = ["KQvK", "KRvK", "KBvK", "KNvK"]
+FOUR = ["KQQvK", "KQRvK", "KQBvK", "KQNvK", "KRRvK", "KRBvK", "KRNvK", "KBBvK", "KBNvK", "KNNvK",
+        "KQvKQ", "KQvKR", "KQvKB", "KQvKN", "KRvKR", "KRvKB", "KRvKN", "KBvKB", "KNvKB", "KNvKN"]
+
+
+# the 8 ways of turning and flipping the board, as lists of where each square ends up
+def transforms():
+
+    moves = [lambda r, c: (r, c), lambda r, c: (r, 7 - c), lambda r, c: (7 - r, c), lambda r, c: (7 - r, 7 - c),
+             lambda r, c: (c, r), lambda r, c: (c, 7 - r), lambda r, c: (7 - c, r), lambda r, c: (7 - c, 7 - r)]
+    return [[row * 8 + col for row, col in (move(sq >> 3, sq & 7) for sq in range(64))] for move in moves]
+
+
+TRANSFORMS = transforms()
+
+# the white king is always turned into the a1-d1-d4 triangle, which leaves 10 squares for it instead of 64
+TRIANGLE = [sq for sq in range(64) if (sq & 7) <= 3 and 7 - (sq >> 3) <= (sq & 7)]
+TRIANGLE_INDEX = {sq: i for i, sq in enumerate(TRIANGLE)}
+NORMALIZE = [[t for t in range(8) if TRANSFORMS[t][sq] in TRIANGLE_INDEX] for sq in range(64)]
+
+
+# the eight directions a sliding piece can travel in as (row change, col change)
+DIRECTIONS = ((-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1))
+ROOK_DIRECTIONS = (0, 1, 2, 3)
+BISHOP_DIRECTIONS = (4, 5, 6, 7)
+
+# a direction is positive if moving along it increases the square number
+POSITIVE = tuple(dr * 8 + dc > 0 for dr, dc in DIRECTIONS)
+
+
+# the bitboard with only the square at row, col set
+def square_bit(row, col):
+    return 1 << (row * 8 + col)
+
+
+# creates a mask out of all the (row change, col change) jumps from every square that stay on the board
+def jump_masks(jumps):
+    masks = []
+    for sq in range(64):
+        row, col = sq >> 3, sq & 7
+        mask = 0
+        for dr, dc in jumps:
+            if 0 <= row + dr <= 7 and 0 <= col + dc <= 7:
+                mask |= square_bit(row + dr, col + dc)
+        masks.append(mask)
+    return masks
+
+
+# creates the squares a slider sees from every square in every direction on an empty board
+def ray_masks():
+    rays = []
+    for dr, dc in DIRECTIONS:
+        direction = []
+        for sq in range(64):
+            row, col = (sq >> 3) + dr, (sq & 7) + dc
+            mask = 0
+            while 0 <= row <= 7 and 0 <= col <= 7:
+                mask |= square_bit(row, col)
+                row += dr
+                col += dc
+            direction.append(mask)
+        rays.append(direction)
+    return rays
+
+
+# precomputed attack masks
+KNIGHT_ATTACKS = jump_masks(((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)))
+KING_ATTACKS = jump_masks(((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)))
+RAYS = ray_masks()
+
+
+# the square of the set bit in blockers closest to the start of a ray going in direction d
+def nearest(d, blockers):
+    if POSITIVE[d]:
+        return (blockers & -blockers).bit_length() - 1
+    return blockers.bit_length() - 1
+
+
+# sliding attacks in the given directions, stopping at (and including) the first blocker on each ray
+def slider_attacks(sq, occupied, directions):
+    attacks = 0
+    for d in directions:
+        ray = RAYS[d][sq]
+        blockers = ray & occupied
+        if blockers:
+            ray ^= RAYS[d][nearest(d, blockers)]
+        attacks |= ray
+    return attacks
+
+
+def rook_attacks(sq, occupied):
+    return slider_attacks(sq, occupied, ROOK_DIRECTIONS)
+
+
+def bishop_attacks(sq, occupied):
+    return slider_attacks(sq, occupied, BISHOP_DIRECTIONS)
+
+
+# squares attacked by a piece on sq
+def attacks(kind, sq, occupied):
+
+    if kind == "K":
+        return KING_ATTACKS[sq]
+    if kind == "N":
+        return KNIGHT_ATTACKS[sq]
+    if kind == "R":
+        return rook_attacks(sq, occupied)
+    if kind == "B":
+        return bishop_attacks(sq, occupied)
+    return rook_attacks(sq, occupied) | bishop_attacks(sq, occupied)
+
+
+# every square in a bitboard
+def bits(board):
+
+    while board:
+        low = board & -board
+        yield low.bit_length() - 1
+        board ^= low
+
+
+# name of the table for the given piece letters of each side and whether the colors have to be swapped to use it
+def table_name(white, black):
+
+    white = "".join(sorted(white, key=KINDS.index))
+    black = "".join(sorted(black, key=KINDS.index))
+    if (sum(STRENGTH[kind] for kind in white), black) >= (sum(STRENGTH[kind] for kind in black), white):
+        return white + "v" + black, False
+    return black + "v" + white, True
+
+
+# the tables needed to build a table, one for every piece that can be captured
+def captures(name):
+
+    white, black = name.split("v")
+    needed = set()
+    for i in range(1, len(white)):
+        needed.add(table_name(white[:i] + white[i + 1:], black)[0])
+    for i in range(1, len(black)):
+        needed.add(table_name(white, black[:i] + black[i + 1:])[0])
+    return sorted(needed - {"KvK"})
+
+
+class Table:
+
+    def __init__(self, name, values=None):
+
+        self.name = name
+        white, black = name.split("v")
+        self.kinds = list(white + black)
+        self.colors = ["w"] * len(white) + ["b"] * len(black)
+        self.kings = {"w": 0, "b": len(white)}          # where each king is in the list of pieces
+        self.size = len(TRIANGLE) * 64 ** (len(self.kinds) - 1)
+
+        # one array of values for each side to move
+        self.values = values if values else {"w": bytearray(self.size), "b": bytearray(self.size)}
+
+    # index of a position given as the square of each piece (in the order of the table's name), positions that are
+    # turned or flipped versions of each other all have the same index
+    def index(self, squares):
+
+        best = None
+        for t in NORMALIZE[squares[0]]:
+            transform = TRANSFORMS[t]
+            index = TRIANGLE_INDEX[transform[squares[0]]]
+            for sq in squares[1:]:
+                index = index * 64 + transform[sq]
+            if best is None or index < best:
+                best = index
+        return best
+
+    # the squares of the pieces in the position at an index
+    def squares(self, index):
+
+        squares = []
+        for _ in range(len(self.kinds) - 1):
+            index, sq = divmod(index, 64)
+            squares.append(sq)
+        squares.append(TRIANGLE[index])
+        squares.reverse()
+        return squares
+
+    # the value of a position given the squares of its pieces
+    def probe(self, squares, turn):
+        return self.values[turn][self.index(squares)]
+
+    def save(self, path):
+
+        with open(path, "wb") as file:
+            file.write(MAGIC)
+            file.write(self.values["w"])
+            file.write(self.values["b"])
+
+
+# opens a table file without reading it in, the values are looked up straight from the mapped file
+def load_table(path, name):
+
+    with open(path, "rb") as file:
+        data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    table = Table(name, {})
+    if data[:len(MAGIC)] != MAGIC or len(data) != len(MAGIC) + 2 * table.size:
+        data.close()
+        raise ValueError(path + " is not a " + name + " table")
+
+    view = memoryview(data)
+    table.values = {"w": view[len(MAGIC):len(MAGIC) + table.size], "b": view[len(MAGIC) + table.size:]}
+    return table
+
+
+# finds the tables in a directory and looks positions up in them
+class Tablebase:
+
+    def __init__(self, directory):
+
+        self.directory = directory
+        self.tables = {}        # tables already opened (None if there is no file for it)
+
+    def table(self, name):
+
+        if name not in self.tables:
+            path = os.path.join(self.directory, name + EXTENSION)
+            self.tables[name] = load_table(path, name) if os.path.exists(path) else None
+        return self.tables[name]
+
+    # the value of a position given as (piece, square) pairs like ("wQ", 36), None if there is no table for it
+    def lookup(self, pieces, turn):
+
+        if len(pieces) == 2:
+            return DRAW
+
+        white = [piece[1] for piece, _ in pieces if piece[0] == "w"]
+        black = [piece[1] for piece, _ in pieces if piece[0] == "b"]
+        name, swap = table_name(white, black)
+        table = self.table(name)
+        if table is None:
+            return None
+
+        # a table with the colors the other way round is used by turning the board upside down
+        if swap:
+            pieces = [(("b" if piece[0] == "w" else "w") + piece[1], sq ^ 56) for piece, sq in pieces]
+            turn = "b" if turn == "w" else "w"
+
+        remaining = list(pieces)
+        squares = []
+        for color, kind in zip(table.colors, table.kinds):
+            for i, (piece, sq) in enumerate(remaining):
+                if piece == color + kind:
+                    squares.append(sq)
+                    del remaining[i]
+                    break
+
+        return table.probe(squares, turn)
+
+    # the value of the game's current position, None if it has pawns, too many pieces or no table
+    def probe(self, game):
+
+        if game.phase > 8:      # more pieces than four could be worth (two queens)
+            return None
+
+        pieces = [(piece, row * 8 + col) for row in range(8) for col in range(8)
+                  for piece in (game.board[row][col],) if piece != "--"]
+        if len(pieces) > 4 or any(piece[1] == "P" for piece, _ in pieces):
+            return None
+
+        return self.lookup(pieces, game.turn)
+
+    # search score of the current position (positive is good for black like in the search), None if it isn't covered,
+    # ply is how deep into the search the position is so the mate is as far away as one the search found
+    def score(self, game, ply=0):
+
+        value = self.probe(game)
+        if value is None or value == ILLEGAL:
+            return None
+        score = value_score(value, ply)
+        return score if game.turn == "b" else -score
+
+    # the move that keeps the best result, the quickest mate when winning and the slowest when losing, and the value
+    # of the position, or (None, None) when the position isn't covered
+    def best_move(self, game):
+
+        value = self.probe(game)
+        if value is None or value == ILLEGAL:
+            return None, None
+
+        best_move = None
+        best_score = None
+        for move in game.all_moves():
+            game.make_move(move)
+            child = self.probe(game)
+            game.undo_move()
+
+            score = 0 if child is None else -value_score(child)       # a missing smaller table counts as a draw
+
+            if best_score is None or score > best_score:
+                best_move, best_score = move, score
+
+        return best_move, value
+
+
+# score of a value for the side to move, ply plies into a search
+def value_score(value, ply=0):
+
+    if value == DRAW:
+        return 0
+    plies = value - 1
+    return WIN - ply - plies if plies % 2 == 1 else ply + plies - WIN
+
+
+# builds one table from the rules alone, the tables it captures down into are looked up in tablebase
+class Builder:
+
+    def __init__(self, name, tablebase):
+
+        self.table = Table(name)
+        self.tablebase = tablebase
+        self.remaining = {"w": bytearray(self.table.size), "b": bytearray(self.table.size)}    # moves not yet lost
+        self.longest = {"w": bytearray(self.table.size), "b": bytearray(self.table.size)}      # see mark()
+        self.queue = [[] for _ in range(ILLEGAL)]       # positions whose value is known, by plies to mate
+
+    def build(self):
+
+        for turn in ("w", "b"):
+            for index in range(self.table.size):
+                self.mark(turn, index)
+
+        for plies in range(len(self.queue)):
+            for turn, index in self.queue[plies]:
+                self.solve(turn, index, plies)
+            self.queue[plies] = None
+
+        return self.table
+
+    # is the square attacked by the color's pieces
+    def attacked(self, sq, color, squares, occupied):
+
+        table = self.table
+        for i, piece_sq in enumerate(squares):
+            if table.colors[i] == color and piece_sq >= 0 and attacks(table.kinds[i], piece_sq, occupied) >> sq & 1:
+                return True
+        return False
+
+    # looks at a position's moves once at the start: positions that can't happen are marked illegal, checkmates are
+    # queued, captures are looked up in the smaller tables, and the number of different positions the other moves
+    # lead to is remembered so the position is known to be lost once all of them are wins for the other side
+    def mark(self, turn, index):
+
+        table = self.table
+        values = table.values[turn]
+        squares = table.squares(index)
+        other = "b" if turn == "w" else "w"
+
+        # each position is only worked out at the index all its turned and flipped versions share
+        if len(set(squares)) != len(squares) or table.index(squares) != index:
+            values[index] = ILLEGAL
+            return
+
+        occupied = 0
+        for sq in squares:
+            occupied |= 1 << sq
+        king = squares[table.kings[turn]]
+        if KING_ATTACKS[king] >> squares[table.kings[other]] & 1 or \
+                self.attacked(squares[table.kings[other]], turn, squares, occupied):
+            values[index] = ILLEGAL
+            return
+
+        children = set()
+        moves = 0
+        longest = 0
+        safe = False        # a capture doesn't lose so this position can't be lost
+
+        for i, sq in enumerate(squares):
+            if table.colors[i] != turn:
+                continue
+
+            for target in bits(attacks(table.kinds[i], sq, occupied)):
+                captured = -1
+                if occupied >> target & 1:
+                    captured = squares.index(target)
+                    if table.colors[captured] == turn:
+                        continue
+
+                after = list(squares)
+                after[i] = target
+                if captured >= 0:
+                    after[captured] = -1
+                moved = (occupied ^ (1 << sq)) | (1 << target)
+                if self.attacked(after[table.kings[turn]], other, after, moved):
+                    continue
+                moves += 1
+
+                if captured < 0:
+                    children.add(table.index(after))
+                    continue
+
+                value = self.tablebase.lookup([(table.colors[j] + table.kinds[j], after[j])
+                                               for j in range(len(after)) if after[j] >= 0], other)
+                if value == DRAW:
+                    safe = True
+                elif (value - 1) % 2 == 0:          # the other side gets mated, so this is a win
+                    self.queue[value].append((turn, index))
+                    safe = True
+                else:
+                    longest = max(longest, value - 1)
+
+        if moves == 0:
+            if self.attacked(king, other, squares, occupied):
+                self.queue[0].append((turn, index))     # checkmate
+            return                                      # stalemate is a draw
+
+        # a position that could only be lost would need every child to be a win for the other side, the longest
+        # mate reached by a capture is kept since it is known before any of the children are
+        self.longest[turn][index] = longest
+        if safe:
+            self.remaining[turn][index] = ILLEGAL       # never counts down to zero
+        elif len(children) == 0:
+            self.queue[longest + 1].append((turn, index))
+        else:
+            self.remaining[turn][index] = len(children)
+
+    # gives a position its value and passes it on to the positions one move before it: they win if it was lost,
+    # and lose if it was their last move that doesn't lose
+    def solve(self, turn, index, plies):
+
+        table = self.table
+        if table.values[turn][index] != DRAW:       # already solved with a quicker mate
+            return
+        if plies + 1 >= ILLEGAL:
+            raise ValueError(table.name + " has a mate too long to store")
+        table.values[turn][index] = plies + 1
+
+        squares = table.squares(index)
+        other = "b" if turn == "w" else "w"
+        occupied = 0
+        for sq in squares:
+            occupied |= 1 << sq
+
+        # the other side moved last, so each of its pieces is moved back to every empty square it could have come from
+        parents = set()
+        values = table.values[other]
+        for i, sq in enumerate(squares):
+            if table.colors[i] != other:
+                continue
+            for source in bits(attacks(table.kinds[i], sq, occupied) & ~occupied):
+                before = list(squares)
+                before[i] = source
+                parent = table.index(before)
+                if values[parent] == DRAW:
+                    parents.add(parent)
+
+        remaining = self.remaining[other]
+        for parent in parents:
+            if plies % 2 == 0:
+                self.queue[plies + 1].append((other, parent))
+            elif remaining[parent] != ILLEGAL:
+                remaining[parent] -= 1
+                if remaining[parent] == 0:
+                    self.queue[max(plies, self.longest[other][parent]) + 1].append((other, parent))
+
+
+# builds a table and everything it captures down into that isn't in the directory yet
+def build(name, directory, out=sys.stderr):
+
+    os.makedirs(directory, exist_ok=True)
+    tablebase = Tablebase(directory)
+    for needed in captures(name):
+        if tablebase.table(needed) is None:
+            build(needed, directory, out)
+            tablebase.tables.pop(needed)
+
+    start = time.perf_counter()
+    table = Builder(name, tablebase).build()
+    table.save(os.path.join(directory, name + EXTENSION))
+
+    longest = max((value - 1 for value in itertools.chain(table.values["w"], table.values["b"])
+                   if value not in (DRAW, ILLEGAL)), default=0)
+    print("{}: {} positions, longest mate {} plies, {:.1f}s".format(name, 2 * table.size, longest,
+                                                                    time.perf_counter() - start), file=out)
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="build or look at endgame tablebases")
+    commands = parser.add_subparsers(dest="command")
+
+    build_parser = commands.add_parser("build", help="build tables into a directory")
+    build_parser.add_argument("directory")
+    build_parser.add_argument("names", nargs="*", help="tables like KQvK (all three piece tables by default)")
+    build_parser.add_argument("--four", action="store_true", help="also build every four piece table")
+
+    probe_parser = commands.add_parser("probe", help="print the value of a position and the best move")
+    probe_parser.add_argument("directory")
+    probe_parser.add_argument("--fen", default="8/8/8/4k3/8/8/8/4K2Q w - - 0 1")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        names = args.names if args.names else THREE + (FOUR if args.four else [])
+        for name in names:
+            if Tablebase(args.directory).table(name) is None:
+                build(name, args.directory)
+
+    elif args.command == "probe":
+        game = ChessEngine.Game()
+        game.load_fen(args.fen)
+        move, value = Tablebase(args.directory).best_move(game)
+        if value is None:
+            print("not in the tablebases")
+        elif value == DRAW:
+            print("draw", move.get_notation() if move else "")
+        else:
+            result = "wins" if (value - 1) % 2 == 1 else "loses"
+            print("side to move {} in {} plies".format(result, value - 1), move.get_notation() if move else "")
+
+    else:
+        parser.print_help()
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,238 @@
+"""
+James Verschleiser
+Plays two AI settings against each other from a set of openings, each opening once with each color, in worker
+processes, and reports the result, the Elo difference with its 95% error bars and the speed of each side
+
+usage: python -m Chess.ChessTournament [--a SETTINGS] [--b SETTINGS] [--openings FILE] [--rounds N] [--workers N]
+                                       [--output FILE]
+
+SETTINGS are comma separated name=value pairs, for example "time=100,ordering=0" or "depth=3,quiescence=0"
+"""
+
+import argparse
+import json
+import math
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from Chess import ChessAI
+from Chess import ChessEngine
+from Chess import ChessWorker
+
+# what an AI setting can have and what it is when it isn't given
+DEFAULTS = {"depth": None, "time": None, "nodes": None, "ordering": True, "quiescence": True, "tt_size": 16}
+DEPTH = 3           # search depth when no depth, time or node limit is given
+MAX_PLIES = 300     # games still going after this many moves are scored as draws
+
+# short opening lines the games start from when no openings file is given
+OPENINGS = ["e4 e5 Nf3 Nc6", "e4 c5 Nf3 d6", "e4 e6 d4 d5", "e4 c6 d4 d5", "d4 d5 c4 e6", "d4 Nf6 c4 g6",
+            "d4 Nf6 c4 e6", "c4 e5 Nc3 Nf6", "Nf3 d5 g3 Nf6", "e4 e5 Nf3 Nf6"]
+
+
+# reads settings like "depth=3,ordering=0" into a full settings dictionary
+def parse_settings(text):
+
+    settings = dict(DEFAULTS)
+    for pair in filter(None, text.split(",")):
+        name, _, value = pair.partition("=")
+        name = name.strip()
+        if name not in DEFAULTS:
+            raise ValueError("unknown setting " + name)
+        if name in ("ordering", "quiescence"):
+            settings[name] = value.strip().lower() not in ("0", "false", "no", "off")
+        else:
+            settings[name] = int(value)
+    return settings
+
+
+# short description of a setting, only the values that differ from the defaults
+def describe(settings):
+
+    text = ",".join("{}={}".format(name, int(value) if isinstance(value, bool) else value)
+                    for name, value in settings.items() if value != DEFAULTS[name])
+    return text if text else "depth={}".format(DEPTH)
+
+
+# the FEN after playing each opening line from the start
+def opening_fens(lines):
+
+    game = ChessEngine.Game()
+    fens = []
+    for line in lines:
+        game.load_fen(ChessEngine.START_FEN)
+        for text in line.split():
+            game.make_move(game.parse_move(text))
+        fens.append(game.get_fen())
+    return fens
+
+
+# asks one side for its move, returns the move and the nodes it searched
+def think(ai, settings, maximize):
+
+    ai.nodes = 0
+    if settings["time"] is None and settings["nodes"] is None:
+        move = ai.find_move(settings["depth"] if settings["depth"] else DEPTH, maximize)
+    else:
+        move = ai.timed_find_move(settings["time"], maximize, settings["nodes"],
+                                  settings["depth"] if settings["depth"] else ChessAI.MAX_DEPTH)
+    return move, ai.nodes
+
+
+# plays one game in a worker, "a" and "b" say which settings play white, returns the result and how each side did
+def play(index, fen, white, black, a_white, max_plies):
+
+    game = ChessEngine.Game()
+    game.load_fen(fen)
+    players = {"w": (ChessAI.AI(game, white["tt_size"], white["ordering"], white["quiescence"]), white),
+               "b": (ChessAI.AI(game, black["tt_size"], black["ordering"], black["quiescence"]), black)}
+    sides = {"w": "a" if a_white else "b", "b": "b" if a_white else "a"}
+    usage = {"a": {"moves": 0, "nodes": 0, "seconds": 0.0}, "b": {"moves": 0, "nodes": 0, "seconds": 0.0}}
+
+    result = None
+    plies = 0
+    while result is None:
+        game.all_moves()        # sets checkmate and stalemate
+        if game.checkmate:
+            result = "0-1" if game.turn == "w" else "1-0"
+        elif game.stalemate or game.is_draw():
+            result = "1/2-1/2"
+        elif plies >= max_plies:
+            result = "1/2-1/2"
+        else:
+            ai, settings = players[game.turn]
+            start = time.perf_counter()
+            move, nodes = think(ai, settings, game.turn == "b")
+            used = usage[sides[game.turn]]
+            used["seconds"] += time.perf_counter() - start
+            used["moves"] += 1
+            used["nodes"] += nodes
+            game.make_move(move)
+            plies += 1
+
+    # the result from a's side: 1 for a win, 0.5 for a draw, 0 for a loss
+    score = 0.5 if result == "1/2-1/2" else float((result == "1-0") == a_white)
+    return {"index": index, "fen": fen, "a_color": "w" if a_white else "b", "result": result, "score": score,
+            "plies": plies, "a": usage["a"], "b": usage["b"]}
+
+
+# Elo difference that a score fraction means, a score of 0 or 1 has no limit
+def elo(score):
+
+    if score <= 0:
+        return -math.inf
+    if score >= 1:
+        return math.inf
+    return 400 * math.log10(score / (1 - score))
+
+
+# a's Elo difference over b and the ends of its 95% interval from the spread of the game scores
+def elo_interval(scores):
+
+    count = len(scores)
+    if count == 0:
+        return 0.0, -math.inf, math.inf
+
+    mean = sum(scores) / count
+    deviation = math.sqrt(sum((score - mean) ** 2 for score in scores) / count / count)
+    return elo(mean), elo(mean - 1.96 * deviation), elo(mean + 1.96 * deviation)
+
+
+# adds up the games into the numbers reported for the match
+def summarize(games):
+
+    scores = [game["score"] for game in games]
+    difference, low, high = elo_interval(scores)
+    summary = {"games": len(games), "wins": scores.count(1.0), "draws": scores.count(0.5),
+               "losses": scores.count(0.0), "score": sum(scores) / max(1, len(scores)),
+               "elo": difference, "elo_low": low, "elo_high": high}
+
+    for side in ("a", "b"):
+        moves = sum(game[side]["moves"] for game in games)
+        nodes = sum(game[side]["nodes"] for game in games)
+        seconds = sum(game[side]["seconds"] for game in games)
+        summary[side] = {"moves": moves, "nodes": nodes, "seconds": seconds,
+                         "nodes_per_second": nodes / max(seconds, 1e-9),
+                         "ms_per_move": 1000 * seconds / max(1, moves)}
+
+    return summary
+
+
+# JSON has no infinity, an Elo difference without a limit is saved as None
+def finite(summary):
+    return {name: None if isinstance(value, float) and math.isinf(value) else value for name, value in summary.items()}
+
+
+def report(a, b, summary, out=sys.stdout):
+
+    print("a: {}\nb: {}".format(describe(a), describe(b)), file=out)
+    print("{games} games, a won {wins}, drew {draws}, lost {losses} (score {score:.1%})".format(**summary), file=out)
+    print("elo difference {elo:+.0f} [{elo_low:+.0f}, {elo_high:+.0f}]".format(**summary), file=out)
+    for side in ("a", "b"):
+        print("{}: {:.0f} nodes/sec, {:.0f} ms/move".format(side, summary[side]["nodes_per_second"],
+                                                            summary[side]["ms_per_move"]), file=out)
+
+
+# plays every opening twice (once with each color for a) rounds times over and returns the games and summary
+def run(a, b, openings, rounds=1, workers=None, max_plies=MAX_PLIES, out=sys.stderr):
+
+    workers = ChessWorker.count(workers)
+    games = []
+
+    with ProcessPoolExecutor(workers) as pool:
+        futures = []
+        for _ in range(rounds):
+            for fen in openings:
+                for a_white in (True, False):
+                    white, black = (a, b) if a_white else (b, a)
+                    futures.append(pool.submit(play, len(futures), fen, white, black, a_white, max_plies))
+
+        for future in as_completed(futures):
+            game = future.result()
+            games.append(game)
+            print("game {}/{}: {} with a as {} ({:.0%} so far)".format(
+                len(games), len(futures), game["result"], "white" if game["a_color"] == "w" else "black",
+                sum(played["score"] for played in games) / len(games)), file=out)
+
+    games.sort(key=lambda game: game["index"])
+    return games, summarize(games)
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="play two AI settings against each other")
+    parser.add_argument("--a", default="", help="settings of the first AI (name=value,...)")
+    parser.add_argument("--b", default="", help="settings of the second AI")
+    parser.add_argument("--openings", help="file of FEN or EPD positions to start from")
+    parser.add_argument("--rounds", type=int, default=1, help="times to go through the openings")
+    parser.add_argument("--workers", type=int, help="worker processes (defaults to one per core)")
+    parser.add_argument("--max-plies", type=int, default=MAX_PLIES, help="score longer games as draws")
+    parser.add_argument("--output", help="JSON file to save the games and results in")
+    args = parser.parse_args(argv)
+
+    try:
+        a = parse_settings(args.a)
+        b = parse_settings(args.b)
+    except ValueError as error:
+        parser.error(str(error))
+
+    if args.openings:
+        with open(args.openings) as lines:
+            openings = list(ChessEngine.fen_lines(lines))
+    else:
+        openings = opening_fens(OPENINGS)
+
+    start = time.perf_counter()
+    games, summary = run(a, b, openings, args.rounds, args.workers, args.max_plies)
+    report(a, b, summary)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({"a": a, "b": b, "started": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                       "seconds": time.perf_counter() - start, "summary": finite(summary), "games": games}, file, indent=2)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
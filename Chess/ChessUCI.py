@@ -0,0 +1,209 @@
+"""
+James Verschleiser
+Runs the engine without a window over the UCI protocol (commands on stdin, answers on stdout) so chess GUIs and
+tournament managers can play against it
+
+usage: python -m Chess.ChessUCI
+"""
+
+import sys
+import threading
+import time
+
+from Chess import ChessAI
+from Chess import ChessEngine
+
+NAME = "Chess"
+AUTHOR = "James Verschleiser"
+MOVES_LEFT = 30         # moves the remaining clock time is shared over when the GUI doesn't say
+OVERHEAD = 50           # milliseconds kept back for talking to the GUI
+
+
+class UCI:
+
+    def __init__(self, out=sys.stdout):
+
+        self.out = out
+        self.lock = threading.Lock()        # the search thread prints its move while the main thread reads commands
+
+        self.game = ChessEngine.Game()
+        self.ai = ChessAI.AI(self.game)
+        self.search = None          # the search currently running
+        self.start = 0              # perf_counter time it started
+        self.infinite = False       # the running search was started with go infinite, so it only answers after stop
+        self.held = None            # lines of a go infinite search that finished before stop came
+
+    def send(self, line):
+
+        with self.lock:
+            self.out.write(line + "\n")
+            self.out.flush()
+
+    # reads commands until quit or the end of the input
+    def run(self, lines=sys.stdin):
+
+        for line in lines:
+            if not self.command(line.strip()):
+                break
+        self.stop()
+
+    # handles one command, returns False for quit
+    def command(self, line):
+
+        words = line.split()
+        if not words:
+            return True
+        name, args = words[0], words[1:]
+
+        if name == "uci":
+            self.send("id name " + NAME)
+            self.send("id author " + AUTHOR)
+            self.send("option name Hash type spin default 16 min 1 max 4096")
+            self.send("option name Book type string default <empty>")
+            self.send("option name Tablebases type string default <empty>")
+            self.send("uciok")
+        elif name == "isready":
+            self.send("readyok")
+        elif name == "setoption":
+            self.stop()
+            self.set_option(args)
+        elif name == "ucinewgame":
+            self.stop()
+            self.ai.clear()
+        elif name == "position":
+            self.stop()
+            self.set_position(args)
+        elif name == "go":
+            self.stop()
+            self.go(args)
+        elif name == "stop":
+            self.stop()
+        elif name == "quit":
+            return False
+        else:
+            self.send("info string unknown command " + name)
+
+        return True
+
+    # setoption name NAME value VALUE
+    def set_option(self, args):
+
+        text = " ".join(args)
+        if " value " not in text:
+            return
+        name, value = text[len("name "):].split(" value ", 1)
+        name = name.strip().lower()
+        value = value.strip()
+
+        # the book and tablebase modules are only imported when they are asked for, a bad value is reported to the
+        # GUI instead of ending the engine
+        try:
+            if name == "hash":
+                self.ai.tt = ChessAI.TranspositionTable(max(1, int(value)))
+            elif name == "book":
+                from Chess import ChessBook
+                self.ai.book = ChessBook.Book(value) if value and value != "<empty>" else None
+            elif name == "tablebases":
+                from Chess import ChessTablebase
+                self.ai.tablebase = ChessTablebase.Tablebase(value) if value and value != "<empty>" else None
+        except (ValueError, OSError) as error:
+            self.send("info string " + str(error))
+
+    # position [startpos | fen FEN] [moves MOVE...]
+    def set_position(self, args):
+
+        moves = args.index("moves") if "moves" in args else len(args)
+        if args and args[0] == "fen":
+            try:
+                self.game.load_fen(" ".join(args[1:moves]))
+            except ValueError as error:
+                self.send("info string " + str(error))
+                return
+        else:
+            self.game.load_fen(ChessEngine.START_FEN)
+
+        for text in args[moves + 1:]:
+            try:
+                self.game.make_move(self.game.parse_move(text))
+            except ValueError as error:
+                self.send("info string " + str(error))
+                break
+
+    # go [depth N] [movetime MS] [nodes N] [wtime MS btime MS winc MS binc MS movestogo N] [infinite]
+    def go(self, args):
+
+        options = {}
+        for i, word in enumerate(args):
+            if i + 1 < len(args) and args[i + 1].lstrip("-").isdigit():
+                options[word] = int(args[i + 1])
+
+        depth = options.get("depth", ChessAI.MAX_DEPTH)
+        nodes = options.get("nodes")
+        time_limit = options.get("movetime")
+
+        # with a clock the time is shared over the moves left, plus most of the increment
+        color = self.game.turn
+        if time_limit is None and color + "time" in options:
+            left = options[color + "time"]
+            increment = options.get(color + "inc", 0)
+            time_limit = left // options.get("movestogo", MOVES_LEFT) + increment * 3 // 4
+            time_limit = max(1, min(time_limit, left - OVERHEAD))
+
+        self.infinite = "infinite" in args
+        if self.infinite:
+            depth, nodes, time_limit = ChessAI.MAX_DEPTH, None, None
+
+        self.start = time.perf_counter()
+        self.search = ChessAI.BackgroundSearch(self.ai, time_limit, color == "b", nodes, depth, self.finished)
+
+    # called from the search thread once the search is over
+    def finished(self, search):
+
+        move = search.move
+        searcher = search.searcher
+        score = searcher.best_score if self.game.turn == "b" else -searcher.best_score     # for the side to move
+        milliseconds = int((time.perf_counter() - self.start) * 1000)
+
+        lines = ["info depth {} score {} nodes {} time {} pv {}".format(
+                     searcher.depth, score_text(score), searcher.nodes, milliseconds,
+                     " ".join(move.get_notation() for move in searcher.pv)),
+                 "bestmove " + (move.get_notation() if move is not None else "0000")]
+
+        # go infinite has to wait for stop even when the search can't go any further
+        with self.lock:
+            if self.infinite:
+                self.held = lines
+                return
+        for line in lines:
+            self.send(line)
+
+    # ends the running search, which sends its best move
+    def stop(self):
+
+        if self.search is not None:
+            with self.lock:
+                self.infinite = False
+                held, self.held = self.held, None
+            for line in held or ():
+                self.send(line)
+            self.search.stop()
+            self.search = None
+
+
+# a score for the side to move the way UCI shows it, mates as the number of moves to mate (negative when being mated)
+def score_text(score):
+
+    if score >= ChessAI.MATE_BOUND:
+        return "mate {}".format((ChessAI.MATE - score + 1) // 2)
+    if score <= -ChessAI.MATE_BOUND:
+        return "mate {}".format(-((ChessAI.MATE + score + 1) // 2))
+    return "cp {}".format(score)
+
+
+def main():
+    UCI().run()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
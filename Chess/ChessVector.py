@@ -0,0 +1,188 @@
+"""
+James Verschleiser
+Evaluates many positions at once with numpy, each position is packed into 64 bytes (one piece code per square, in
+the same row * 8 + col order as the board) and a whole array of them is scored with the evaluation tables in a few
+array operations, giving exactly the same scores as Game.evaluate
+
+Packed files are a short header followed by the 64 bytes of every position, they are memory-mapped when read so a
+file bigger than memory can still be evaluated a chunk at a time
+
+usage: python -m Chess.ChessVector pack INPUT OUTPUT
+       python -m Chess.ChessVector evaluate INPUT [--output FILE] [--check]
+"""
+
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from Chess import ChessEngine
+from Chess import ChessEval
+
+MAGIC = b"CHPS\x01\x00\x00\x00"        # start of every packed positions file (the last bytes are the format version)
+CHUNK = 65536                           # positions scored at a time, so memory use doesn't grow with the input
+
+# piece code of each square, empty squares are 0
+PIECES = ["--", "wP", "wN", "wB", "wR", "wQ", "wK", "bP", "bN", "bB", "bR", "bQ", "bK"]
+CODES = {piece: code for code, piece in enumerate(PIECES)}
+FEN_CODES = {ChessEngine.PIECE_CHARS[piece]: code for piece, code in CODES.items() if piece != "--"}
+
+
+# the evaluation tables as arrays indexed by [piece code, square], the empty square row is all zeros
+def score_table(scores):
+
+    table = np.zeros((len(PIECES), 64), dtype=np.int32)
+    for piece, code in CODES.items():
+        if piece != "--":
+            table[code] = scores[piece]
+    return table
+
+
+MG_TABLE = score_table(ChessEval.MG_SCORES)
+EG_TABLE = score_table(ChessEval.EG_SCORES)
+PHASE_TABLE = np.array([ChessEval.PHASES.get(piece, 0) for piece in PIECES], dtype=np.int32)
+SQUARE_INDEX = np.arange(64)
+
+
+# the 64 piece codes of a board (a Game's list of rows)
+def encode_board(board):
+    return bytes(CODES[square] for row in board for square in row)
+
+
+# the 64 piece codes of the board field of a FEN, read straight from the text without setting up a game
+def encode_fen(fen):
+
+    codes = bytearray()
+    for rank in fen.split()[0].split("/"):
+        for char in rank:
+            if char.isdigit():
+                codes.extend(bytes(int(char)))
+            elif char in FEN_CODES:
+                codes.append(FEN_CODES[char])
+            else:
+                raise ValueError("bad FEN board: " + fen)
+
+    if len(codes) != 64:
+        raise ValueError("bad FEN board: " + fen)
+    return bytes(codes)
+
+
+# packs games, boards or FEN strings into an (N, 64) int8 array
+def encode(positions):
+
+    data = bytearray()
+    for position in positions:
+        if isinstance(position, str):
+            data += encode_fen(position)
+        elif isinstance(position, ChessEngine.Game):
+            data += encode_board(position.board)
+        else:
+            data += encode_board(position)
+
+    return np.frombuffer(bytes(data), dtype=np.int8).reshape(-1, 64)
+
+
+# scores from white's point of view in centipawns of every position in an (N, 64) array of piece codes, the same
+# numbers Game.evaluate gives (the middlegame and endgame scores blended by the phase and floored)
+def evaluate(boards, chunk=CHUNK):
+
+    boards = np.asarray(boards).reshape(-1, 64)
+    scores = np.empty(len(boards), dtype=np.int32)
+
+    for start in range(0, len(boards), chunk):
+        codes = boards[start:start + chunk].astype(np.intp)
+        mg = MG_TABLE[codes, SQUARE_INDEX].sum(axis=1)
+        eg = EG_TABLE[codes, SQUARE_INDEX].sum(axis=1)
+        phase = np.minimum(PHASE_TABLE[codes].sum(axis=1), ChessEval.MAX_PHASE)
+        scores[start:start + chunk] = (mg * phase + eg * (ChessEval.MAX_PHASE - phase)) // ChessEval.MAX_PHASE
+
+    return scores
+
+
+# writes the positions in FEN lines to a packed file a chunk at a time, returns how many were written
+def pack(lines, path, chunk=CHUNK):
+
+    count = 0
+    with open(path, "wb") as file:
+        file.write(MAGIC)
+        data = bytearray()
+        for fen in ChessEngine.fen_lines(lines):
+            data += encode_fen(fen)
+            count += 1
+            if count % chunk == 0:
+                file.write(data)
+                data = bytearray()
+        file.write(data)
+
+    return count
+
+
+# the positions of a packed file as a read only memory-mapped (N, 64) array
+def load(path):
+
+    with open(path, "rb") as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(path + " is not a packed positions file")
+
+    return np.memmap(path, dtype=np.int8, mode="r", offset=len(MAGIC)).reshape(-1, 64)
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="pack positions into a file and evaluate them all at once")
+    commands = parser.add_subparsers(dest="command")
+
+    pack_parser = commands.add_parser("pack", help="pack a file of FEN or EPD positions")
+    pack_parser.add_argument("input")
+    pack_parser.add_argument("output")
+
+    evaluate_parser = commands.add_parser("evaluate", help="evaluate a packed file or a file of FEN positions")
+    evaluate_parser.add_argument("input")
+    evaluate_parser.add_argument("--output", help="save the scores to this .npy file")
+    evaluate_parser.add_argument("--check", action="store_true",
+                                 help="compare with the scores of Game.evaluate (FEN input only)")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "pack":
+        with open(args.input) as lines:
+            print("{} positions".format(pack(lines, args.output)))
+
+    elif args.command == "evaluate":
+        with open(args.input, "rb") as file:
+            packed = file.read(len(MAGIC)) == MAGIC
+        if packed:
+            boards = load(args.input)
+        else:
+            with open(args.input) as lines:
+                boards = encode(ChessEngine.fen_lines(lines))
+
+        start = time.perf_counter()
+        scores = evaluate(boards)
+        seconds = time.perf_counter() - start
+        print("{} positions in {:.3f}s ({:.0f} positions/sec)".format(len(scores), seconds,
+                                                                     len(scores) / max(seconds, 1e-9)))
+
+        if args.output:
+            np.save(args.output, scores)
+
+        if args.check and not packed:
+            wrong = 0
+            for i, game in enumerate(ChessEngine.read_fens(args.input)):
+                if game.evaluate() != scores[i]:
+                    wrong += 1
+                    print("position {}: {} instead of {}".format(i + 1, scores[i], game.evaluate()))
+            print("{} scores differ".format(wrong))
+            if wrong:
+                return 1
+
+    else:
+        parser.print_help()
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,35 @@
+"""
+James Verschleiser
+The game and AI every process of a worker pool sets up once when it starts and reuses for every task it is given,
+shared by the batch analysis, the parallel search and the game server
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from Chess import ChessAI
+from Chess import ChessEngine
+
+# set up in each worker process by init, tasks run in the worker read them from here
+game = None
+ai = None
+
+
+# the number of worker processes to use, one per core unless it is given
+def count(workers=None):
+    return workers if workers else os.cpu_count() or 1
+
+
+# runs once in every worker process, setup (if given) is called after with args for anything else the pool needs
+def init(tt_size, setup=None, *args):
+
+    global game, ai
+    game = ChessEngine.Game()
+    ai = ChessAI.AI(game, tt_size)
+    if setup is not None:
+        setup(*args)
+
+
+# a pool of worker processes that each have their own game and AI with a tt_size megabyte transposition table
+def pool(workers=None, tt_size=16, setup=None, *args):
+    return ProcessPoolExecutor(count(workers), initializer=init, initargs=(tt_size, setup) + args)